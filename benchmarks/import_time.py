@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+"""import_time.py: measures the startup cost (wall time, peak RSS and heavy modules loaded) of importing pipdb."""
+
+__author__      = "Fraser King"
+__year__        = "2024"
+__institution__   = "University of Michigan"
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['xarray', 'pandas', 'scipy', 'matplotlib', 'cartopy', 'shapely', 'netCDF4']
+
+SCENARIOS = {
+    'import pipdb': 'import pipdb',
+    'pread loader': 'import pipdb; pipdb.load_single_year_data',
+    'pcalc summary': 'import pipdb; pipdb.describe_dataset',
+    'pplot quicklook': 'import pipdb; pipdb.plot_precip_data_for_day',
+}
+
+# run in a fresh interpreter so nothing is already imported
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+exec({statement!r})
+seconds = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+rss = rss / 1024**2 if sys.platform == 'darwin' else rss / 1024
+print(json.dumps({{'seconds': seconds, 'rss_mb': rss, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(statement, repeat=5):
+    """
+    Runs statement in fresh interpreters and returns the best wall time, the matching peak RSS and the heavy modules it loaded.
+
+    Parameters:
+    - statement: Python source to time (e.g., 'import pipdb').
+    - repeat: Number of fresh interpreters to start.
+
+    Returns:
+    - Dictionary with seconds, rss_mb and loaded.
+    """
+
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(statement=statement, heavy=HEAVY_MODULES)],
+                                env=env, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return min(runs, key=lambda run: run['seconds'])
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the startup cost of importing pipdb.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', default=None, help='Write the results to this file.')
+    args = parser.parse_args()
+
+    results = {}
+    for name, statement in SCENARIOS.items():
+        results[name] = measure_import(statement, args.repeat)
+        print(f"{name:<18} {results[name]['seconds']:>7.3f} s {results[name]['rss_mb']:>8.1f} MB  loads: {', '.join(results[name]['loaded']) or '-'}")
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+"""run_benchmarks.py: times the pread/pcalc/pplot hot paths on synthetic archives of several sizes."""
+
+__author__      = "Fraser King"
+__year__        = "2024"
+__institution__   = "University of Michigan"
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_synthetic_archive
+from pipdb import pread, pcalc, pplot
+
+
+def measure(func, repeat=3):
+    """
+    Times func (best of repeat runs) and measures its peak traced memory in one extra run.
+
+    Parameters:
+    - func: Zero-argument callable to benchmark.
+    - repeat: Number of timed runs.
+
+    Returns:
+    - (seconds, peak_mb) tuple.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        plt.close('all')
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        plt.close('all')
+
+    return min(timings), peak / 1024**2
+
+
+
+def benchmark_archive(main_path, sites, years, repeat=3, plots=True, maps=False):
+    """
+    Runs every benchmark against one synthetic archive.
+
+    Parameters:
+    - main_path: Root of the synthetic archive.
+    - sites: Site names present in the archive.
+    - years: Years present in the archive.
+    - repeat: Number of timed runs per benchmark.
+    - plots: If True, include the plotting functions.
+    - maps: If True, include plot_site/plot_sites (requires the Natural Earth data to be available).
+
+    Returns:
+    - Dictionary mapping benchmark name to (seconds, peak_mb).
+    """
+
+    site, year = sites[0], years[0]
+    base_dir = os.path.join(main_path, f'{year}_{site}', 'netCDF')
+    first_date = min(pread.get_common_dates(base_dir, pread.FILE_PATTERNS))[-8:]
+    month, day = int(first_date[4:6]), int(first_date[6:8])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        ds = pread.load_single_year_data(base_dir, site, year)
+        ds_day = pread.get_precip_data_for_day(base_dir, site, year, month, day)
+
+    benchmarks = {
+        'get_precip_data_for_day': lambda: pread.get_precip_data_for_day(base_dir, site, year, month, day),
+        'load_single_year_data': lambda: pread.load_single_year_data(base_dir, site, year),
+        'load_single_year_data (netcdf4)': lambda: pread.load_single_year_data(base_dir, site, year, reader='netcdf4'),
+        'load_data_for_sites': lambda: pread.load_data_for_sites(main_path, sites),
+        'get_psd_params': lambda: pcalc.get_psd_params(ds),
+        'describe_dataset': lambda: pcalc.describe_dataset(ds),
+        'split_dataset_by_ed_adj': lambda: pcalc.split_dataset_by_ed_adj(ds),
+        'derived_microphysics': lambda: pcalc.derived_microphysics(ds),
+    }
+
+    if plots:
+        benchmarks.update({
+            'plot_precip_data_for_day': lambda: pplot.plot_precip_data_for_day(ds_day, site, year, month, day, save_path=None, show=False),
+            'plot_distribution_means_with_confidence_intervals': lambda: pplot.plot_distribution_means_with_confidence_intervals(ds),
+            'compare_adjusted_values': lambda: pplot.compare_adjusted_values(ds),
+            'compare_adjusted_values (density)': lambda: pplot.compare_adjusted_values(ds, mode='density'),
+        })
+
+    if maps:
+        benchmarks.update({
+            'plot_site': lambda: pplot.plot_site(site, ds),
+            'plot_sites': lambda: pplot.plot_sites({site: ds}),
+        })
+
+    results = {}
+    for name, func in benchmarks.items():
+        results[name] = measure(func, repeat)
+        print(f'  {name:<52} {results[name][0]:>9.3f} s {results[name][1]:>10.1f} MB')
+    return results
+
+
+
+def compare_results(results, baseline, tolerance=1.25):
+    """
+    Compares results against a baseline run and lists every benchmark that got slower or heavier.
+
+    Parameters:
+    - results: Nested dictionary {size: {benchmark: {'seconds': s, 'peak_mb': m}}}.
+    - baseline: Dictionary of the same shape from an earlier run.
+    - tolerance: Allowed ratio to the baseline before a benchmark counts as a regression.
+
+    Returns:
+    - List of regression messages (empty if there are none).
+    """
+
+    regressions = []
+    for size, benchmarks in results.items():
+        for name, current in benchmarks.items():
+            previous = baseline.get(size, {}).get(name)
+            if previous is None:
+                continue
+            for key in ('seconds', 'peak_mb'):
+                if previous[key] > 0 and current[key] > previous[key] * tolerance:
+                    regressions.append(f'{size} {name}: {key} {previous[key]:.3f} -> {current[key]:.3f}')
+    return regressions
+
+
+
+def main():
+    warnings.simplefilter('ignore', FutureWarning)
+    warnings.simplefilter('ignore', RuntimeWarning)
+
+    parser = argparse.ArgumentParser(description='Benchmark pipdb on synthetic PIP archives.')
+    parser.add_argument('--days', nargs='+', type=int, default=[7, 30, 90], help='Archive sizes (days per site-year).')
+    parser.add_argument('--sites', nargs='+', default=['MQT', 'NSA'])
+    parser.add_argument('--years', nargs='+', type=int, default=[2018])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', default=None, help='Where archives are written and reused (default: a temporary directory).')
+    parser.add_argument('--no-plots', action='store_true', help='Skip the plotting benchmarks.')
+    parser.add_argument('--maps', action='store_true', help='Include plot_site/plot_sites (needs Natural Earth data).')
+    parser.add_argument('--json', default=None, help='Write the results to this file.')
+    parser.add_argument('--compare', default=None, help='Baseline results file to check for regressions.')
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir) if args.workdir is not None else tempfile.mkdtemp(prefix='pipdb_bench_')
+
+    # the plotting functions save to ../images relative to the working directory
+    os.makedirs(os.path.join(workdir, 'images'), exist_ok=True)
+    os.makedirs(os.path.join(workdir, 'run'), exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(os.path.join(workdir, 'run'))
+
+    results = {}
+    try:
+        for n_days in args.days:
+            main_path = os.path.join(workdir, f'archive_{n_days}d')
+            if not os.path.isdir(main_path):
+                print(f'Writing synthetic archive: {n_days} days x {len(args.sites)} sites x {len(args.years)} years')
+                write_synthetic_archive(main_path, args.sites, args.years, n_days)
+
+            print(f'Benchmarking {n_days} days:')
+            timings = benchmark_archive(main_path, args.sites, args.years, args.repeat, not args.no_plots, args.maps)
+            results[f'{n_days}d'] = {name: {'seconds': seconds, 'peak_mb': peak_mb}
+                                     for name, (seconds, peak_mb) in timings.items()}
+    finally:
+        os.chdir(cwd)
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f'Regression: {message}')
+        if regressions:
+            sys.exit(1)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+"""synthetic.py: writes a synthetic PIP archive with the same layout as the DeepBlue data for offline benchmarking."""
+
+__author__      = "Fraser King"
+__year__        = "2024"
+__institution__   = "University of Michigan"
+
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+N_MINUTES = 1440
+N_BINS = 131
+BIN_CENTERS = np.round(0.1 + 0.2 * np.arange(N_BINS), 2)
+
+PRODUCTS = {
+    'adjusted_edensity_lwe_rate': 'min',
+    'edensity_distributions': 'rho',
+    'particle_size_distributions': 'psd',
+    'velocity_distributions': 'vvd',
+}
+
+SITE_POSITIONS = {
+    'HUR': (42.6, -71.5), 'KO1': (37.7, 128.7), 'KO2': (37.7, 128.8), 'IMP': (46.5, -84.4), 'YFB': (63.7, -68.5),
+    'MQT': (46.5, -87.5), 'FIN': (61.8, 24.3), 'APX': (44.9, -84.7), 'HAK': (61.9, 24.3), 'KIS': (38.3, 140.3),
+    'NSA': (71.3, -156.6),
+}
+
+
+def write_synthetic_archive(main_path, sites=('MQT',), years=(2018,), n_days=30, missing_day_fraction=0.05,
+                            missing_file_fraction=0.01, precip_fraction=0.2, seed=0):
+    """
+    Writes a synthetic MAIN_PATH tree: YEAR_SITE/netCDF/<product>/XXXYYYYMMDD_<min|rho|psd|vvd>.nc.
+
+    Each file holds 1440 one-minute steps (and 131 bins for the distributions). Minutes without precipitation
+    are NaN (or zero) in the distributions, some whole days are missing and a few single product files are
+    missing, so the loaders see the same gaps they do on the real archive.
+
+    Parameters:
+    - main_path: Directory to write the archive into.
+    - sites: Site names (see pconfig.ALL_SITES).
+    - years: Years to write, one YEAR_SITE folder each.
+    - n_days: Number of days written per site-year, starting on January 1.
+    - missing_day_fraction: Fraction of days with no files at all.
+    - missing_file_fraction: Fraction of the remaining day/product files that are missing.
+    - precip_fraction: Approximate fraction of minutes with precipitation.
+    - seed: Random seed.
+
+    Returns:
+    - Number of files written.
+    """
+
+    rng = np.random.default_rng(seed)
+    n_files = 0
+
+    for site in sites:
+        lat, lon = SITE_POSITIONS.get(site, (60.0, 0.0))
+        instrument = f'{rng.integers(1, 20):03d}'
+
+        for year in years:
+            base_dir = os.path.join(main_path, f'{year}_{site}', 'netCDF')
+            for product in PRODUCTS:
+                os.makedirs(os.path.join(base_dir, product), exist_ok=True)
+
+            for day in pd.date_range(f'{year}-01-01', periods=n_days, freq='D'):
+                if rng.random() < missing_day_fraction:
+                    continue
+
+                for product, ds in _synthetic_day(rng, day, lat, lon, precip_fraction).items():
+                    if rng.random() < missing_file_fraction:
+                        continue
+                    path = os.path.join(base_dir, product, f'{instrument}{day:%Y%m%d}_{PRODUCTS[product]}.nc')
+                    ds.to_netcdf(path)
+                    n_files += 1
+
+    return n_files
+
+
+
+def _synthetic_day(rng, day, lat, lon, precip_fraction):
+    """
+    Builds the four daily datasets for one site-day.
+    """
+
+    time = pd.date_range(day, periods=N_MINUTES, freq='min')
+
+    # precipitation comes in events of a few minutes to a few hours
+    precipitating = np.zeros(N_MINUTES, dtype=bool)
+    minute = 0
+    while minute < N_MINUTES:
+        length = int(rng.integers(5, 240))
+        precipitating[minute:minute + length] = rng.random() < precip_fraction
+        minute += length
+
+    ed_adj = np.where(precipitating, np.clip(rng.normal(0.2, 0.15, N_MINUTES), 0.01, 1.0), np.nan)
+    rate = np.where(precipitating, rng.gamma(1.0, 0.5, N_MINUTES), 0.0)
+    nrr_adj = np.where(ed_adj <= 0.4, rate, 0.0)
+    rr_adj = np.where(ed_adj > 0.4, rate, 0.0)
+
+    N0 = rng.lognormal(np.log(1e3), 0.8, N_MINUTES)[:, None]
+    lam = rng.uniform(0.5, 3.0, N_MINUTES)[:, None]
+    psd = N0 * np.exp(-lam * BIN_CENTERS[None, :]) * rng.lognormal(0, 0.3, (N_MINUTES, N_BINS))
+    psd[psd < 0.1] = 0.0
+    vvd = np.where(psd > 0, np.clip(0.8 + 0.2 * np.sqrt(BIN_CENTERS)[None, :] + rng.normal(0, 0.1, psd.shape), 0, 3), 0.0)
+    rho = np.where(psd > 0, np.clip(0.3 * BIN_CENTERS[None, :] ** -0.5 + rng.normal(0, 0.02, psd.shape), 0, 1), 0.0)
+
+    # outside precipitation the distributions are mostly NaN, sometimes zero
+    empty = ~precipitating
+    fill = np.where(rng.random(N_MINUTES) < 0.8, np.nan, 0.0)[:, None]
+    psd, vvd, rho = (np.where(empty[:, None], fill, values) for values in (psd, vvd, rho))
+
+    coords = {'time': time}
+    dist_coords = {'time': time, 'bin_centers': BIN_CENTERS}
+    position = {'lat': lat, 'lon': lon}
+
+    return {
+        'adjusted_edensity_lwe_rate': xr.Dataset({
+            'ed': ('time', ed_adj * rng.uniform(0.9, 1.1, N_MINUTES)),
+            'rr': ('time', rr_adj * rng.uniform(0.9, 1.1, N_MINUTES)),
+            'nrr': ('time', nrr_adj * rng.uniform(0.9, 1.1, N_MINUTES)),
+            'ed_adj': ('time', ed_adj), 'rr_adj': ('time', rr_adj), 'nrr_adj': ('time', nrr_adj), **position}, coords=coords),
+        'edensity_distributions': xr.Dataset({'rho': (('time', 'bin_centers'), rho), **position}, coords=dist_coords),
+        'particle_size_distributions': xr.Dataset({'psd': (('time', 'bin_centers'), psd), **position}, coords=dist_coords),
+        'velocity_distributions': xr.Dataset({'vvd': (('time', 'bin_centers'), vvd), **position}, coords=dist_coords),
+    }
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic PIP archive for benchmarking.')
+    parser.add_argument('main_path')
+    parser.add_argument('--sites', nargs='+', default=['MQT'])
+    parser.add_argument('--years', nargs='+', type=int, default=[2018])
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    n_files = write_synthetic_archive(args.main_path, args.sites, args.years, args.days, seed=args.seed)
+    print(f'Wrote {n_files} files to {args.main_path}')
@@ -1,6 +1,36 @@
+import importlib
 from . import pconfig
-from .pread import get_precip_data_for_day, load_single_year_data, load_data_for_sites
-from .pplot import (plot_precip_data_for_day, plot_inverse_exponential,
-                    plot_distribution_means_with_confidence_intervals,
-                    plot_site, plot_sites, compare_adjusted_values)
-from .pcalc import get_psd_params, split_dataset_by_ed_adj, describe_dataset
\ No newline at end of file
+
+# Public API, imported from its module on first use so e.g. ingest code using only pread never loads
+# matplotlib, cartopy or scipy.
+_EXPORTS = {
+    'pread': ['get_precip_data_for_day', 'load_single_year_data', 'load_data_for_sites', 'load_range',
+              'iter_days', 'aiter_days', 'compact_distributions', 'expand_distributions', 'instrument'],
+    'pplot': ['plot_precip_data_for_day', 'plot_inverse_exponential',
+              'plot_distribution_means_with_confidence_intervals',
+              'plot_site', 'plot_sites', 'compare_adjusted_values', 'render_quicklooks', 'plot_pyramid'],
+    'pcalc': ['get_psd_params', 'get_psd_params_series', 'split_dataset_by_ed_adj', 'describe_dataset',
+              'summarize_dataset', 'merge_summaries', 'partition_dataset', 'aggregate_distributions',
+              'merge_aggregates', 'aggregate_statistics', 'aggregate_archive', 'comparison_histograms',
+              'merge_comparison_histograms', 'comparison_statistics', 'derived_microphysics', 'derived_archive'],
+    'pcatalog': ['open_catalog'],
+    'pcli': ['update_daily_summaries'],
+    'pevents': ['find_events', 'build_event_table', 'query_events', 'load_event'],
+    'ppyramid': ['build_pyramid', 'build_site_pyramid', 'write_pyramid', 'open_pyramid'],
+}
+_EXPORT_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = ['pconfig'] + list(_EXPORT_MODULES)
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return importlib.import_module(f'.{name}', __package__)
+    if name not in _EXPORT_MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f'.{_EXPORT_MODULES[name]}', __package__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS) | set(_EXPORT_MODULES))
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+"""pcache.py: utility resource for caching merged site-year datasets on disk."""
+
+__author__      = "Fraser King"
+__year__        = "2024"
+__institution__   = "University of Michigan"
+
+import xarray as xr
+import hashlib
+import glob
+import os
+
+SIGNATURE_ATTR = 'pipdb_source_signature'
+
+
+def source_signature(base_dir, file_patterns, catalog=None):
+    """
+    Builds a signature of all source files for a site-year so a cache entry can be invalidated when they change.
+
+    Parameters:
+    - base_dir: Base directory for the site-year data (i.e., the netCDF folder).
+    - file_patterns: Dictionary of file patterns for different data types.
+    - catalog: Optional pcatalog.Catalog used instead of listing and stat-ing the files.
+
+    Returns:
+    - A hex digest that changes whenever a file is added, removed, resized or modified.
+    """
+
+    digest = hashlib.sha1()
+    for pattern in file_patterns.values():
+        if catalog is not None:
+            entries = catalog.stat(os.path.join(base_dir, pattern))
+        else:
+            entries = []
+            for file in sorted(glob.glob(os.path.join(base_dir, pattern))):
+                stat = os.stat(file)
+                entries.append((file, stat.st_size, stat.st_mtime_ns))
+
+        for file, size, mtime in entries:
+            digest.update(f'{os.path.relpath(file, base_dir)}:{size}:{mtime};'.encode())
+    return digest.hexdigest()
+
+
+
+def cache_path(cache_dir, site_name, year, variant=None):
+    """
+    Location of the cache entry for a site-year (variant distinguishes e.g. compact layouts).
+    """
+
+    suffix = f'_{variant}' if variant is not None else ''
+    return os.path.join(cache_dir, f'{year}_{site_name}{suffix}.nc')
+
+
+
+def read_cached(cache_dir, site_name, year, signature, variant=None):
+    """
+    Opens a cached site-year if it exists and was built from the same source files.
+
+    Parameters:
+    - cache_dir: Directory holding the cache entries.
+    - site_name: The site name (e.g., "SITE")
+    - year: The year (YYYY)
+    - signature: Current source signature (see source_signature).
+    - variant: Optional name of the cached layout (e.g., the loaders' compact option).
+
+    Returns:
+    - A lazily loaded xarray.Dataset, or None if the entry is missing or stale.
+    """
+
+    path = cache_path(cache_dir, site_name, year, variant)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        ds = xr.open_dataset(path)
+    except (OSError, ValueError):
+        print(f'Warning: Ignoring unreadable cache entry {path}')
+        return None
+
+    if ds.attrs.get(SIGNATURE_ATTR) != signature:
+        ds.close()
+        return None
+
+    del ds.attrs[SIGNATURE_ATTR]
+    return ds
+
+
+
+def write_cached(ds, cache_dir, site_name, year, signature, variant=None, complevel=4):
+    """
+    Writes a merged site-year to a single chunked, compressed NetCDF file.
+
+    Parameters:
+    - ds: xarray.Dataset to cache.
+    - cache_dir: Directory holding the cache entries.
+    - site_name: The site name (e.g., "SITE")
+    - year: The year (YYYY)
+    - signature: Source signature the dataset was built from.
+    - variant: Optional name of the cached layout (e.g., the loaders' compact option).
+    - complevel: zlib compression level.
+    """
+
+    if len(ds.data_vars) == 0:
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    ds = ds.drop_encoding()
+    ds.attrs[SIGNATURE_ATTR] = signature
+
+    encoding = {}
+    for name, data_array in ds.data_vars.items():
+        if data_array.ndim == 0 or data_array.size == 0 or data_array.dtype.kind not in 'fiu':
+            continue
+        chunks = (min(1440, data_array.shape[0]),) + data_array.shape[1:]
+        encoding[name] = {'zlib': True, 'complevel': complevel, 'chunksizes': chunks}
+
+    path = cache_path(cache_dir, site_name, year, variant)
+    tmp_path = path + '.tmp'
+    ds.to_netcdf(tmp_path, encoding=encoding)
+    os.replace(tmp_path, path)
+
+
+
+def write_table(table, path, descriptions=None, complevel=4):
+    """
+    Writes a pandas.DataFrame as a compressed NetCDF table, one variable (column) per field on a 'row' dimension.
+
+    Parameters:
+    - table: pandas.DataFrame to write (text columns are stored as strings).
+    - path: Output file, replaced atomically.
+    - descriptions: Optional dictionary of column descriptions stored as variable attributes.
+    - complevel: zlib compression level of the numeric and time columns.
+    """
+
+    table = table.reset_index(drop=True).infer_objects()
+    ds = xr.Dataset({column: ('row', table[column].values) for column in table.columns})
+
+    encoding = {}
+    for column in table.columns:
+        if table[column].dtype.kind in 'biufM':
+            encoding[column] = {'zlib': True, 'complevel': complevel}
+        else:
+            ds[column] = ds[column].astype(str)
+        if descriptions is not None and column in descriptions:
+            ds[column].attrs['description'] = descriptions[column]
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    ds.to_netcdf(tmp_path, encoding=encoding)
+    os.replace(tmp_path, path)
+
+
+
+def read_table(path):
+    """
+    Reads a table written by write_table.
+
+    Returns:
+    - A pandas.DataFrame, or None if the file does not exist or cannot be read.
+    """
+
+    if not os.path.exists(path):
+        return None
+    try:
+        with xr.open_dataset(path) as ds:
+            ds = ds.load()
+    except (OSError, ValueError):
+        print(f'Warning: Ignoring unreadable table {path}')
+        return None
+
+    return ds.to_dataframe().reset_index(drop=True)[list(ds.data_vars)]
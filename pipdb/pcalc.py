@@ -7,43 +7,276 @@ __year__        = "2024"
 __institution__   = "University of Michigan"
 
 import numpy as np
-from scipy.optimize import curve_fit
+import os
+import pandas as pd
+import xarray as xr
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from . import pcache
+from . import pconfig
+from . import pread
 
+N0_MAX = 10**7
+LAMBDA_MAX = 10
 
-def describe_dataset(ds):
-    excluded_vars = ['lat', 'lon', 'edensity_distributions_rho', 'particle_size_distributions_psd', 'velocity_distributions_vvd'] # ignore 2d vars for readability
+
+EXCLUDED_SUMMARY_VARS = ['lat', 'lon', 'edensity_distributions_rho', 'particle_size_distributions_psd', 'velocity_distributions_vvd'] # ignore 2d vars for readability
+
+
+def describe_dataset(ds, chunk_size=10080):
+    """
+    Prints statistical summaries for each 1D variable in a dataset.
+
+    Parameters:
+    - ds: xarray.Dataset containing the PIP data variables.
+    - chunk_size: Number of time steps read at once (see summarize_dataset, which returns the summaries).
+    """
+
+    summaries = summarize_dataset(ds, chunk_size=chunk_size)
 
     print("Dataset statistics:")
     print(f'Site position: ({ds.lat.values}, {ds.lon.values})')
     print()
 
-    for var_name, data_array in ds.data_vars.items():
-        if var_name in excluded_vars:
+    for var_name, summary in summaries.items():
+        stats = summary.to_dict()
+        print(f"{var_name}:")
+        print(f"    Mean = {stats['mean']}, Standard Deviation = {stats['std']}")
+        print(f"    25th Percentile = {stats['q25']}, Median = {stats['median']}, 75th Percentile = {stats['q75']}")
+        print(f"    Non-NaN Count = {stats['count']}, Unique Values = {stats['unique']}")
+        print(f"    Sum = {stats['sum']}, Data Type = {stats['dtype']}")
+        print(f"    Memory Usage = {stats['nbytes']} bytes\n")
+
+
+def summarize_dataset(ds, variables=None, chunk_size=10080, summaries=None):
+    """
+    Computes mergeable statistics for each variable in a single streaming pass over time.
+
+    The dataset is read chunk_size time steps at a time, so lazily opened (e.g., cached) datasets are never
+    fully materialised. Quantiles and distinct counts are approximate for large inputs (see VariableSummary).
+
+    Parameters:
+    - ds: xarray.Dataset containing the PIP data variables.
+    - variables: Variables to summarise (default: every data variable except lat, lon and the 2D distributions).
+    - chunk_size: Number of time steps read at once.
+    - summaries: Optional existing summaries to update in place (e.g., when feeding one day at a time).
+
+    Returns:
+    - Dictionary of VariableSummary objects keyed by variable name.
+    """
+
+    if variables is None:
+        variables = [name for name in ds.data_vars
+                     if name not in EXCLUDED_SUMMARY_VARS and not name.endswith(pread.ROW_SUFFIX)]
+    if summaries is None:
+        summaries = {}
+
+    for var_name in variables:
+        data_array = ds[var_name]
+        summary = summaries.setdefault(var_name, VariableSummary())
+        if 'time' not in data_array.dims:
+            summary.update(data_array.values)
             continue
+        for start in range(0, data_array.sizes['time'], chunk_size):
+            summary.update(data_array.isel(time=slice(start, start + chunk_size)).values)
 
-        mean_val = data_array.mean(dim='time', skipna=True).values
-        std_val = data_array.std(dim='time', skipna=True).values
-        quantiles = data_array.quantile([0.25, 0.5, 0.75], dim='time', skipna=True).values
-        non_nan_count = data_array.count(dim='time').values
-        unique_values_count = np.unique(data_array.values[~np.isnan(data_array.values)]).size
-        sum_val = data_array.sum(dim='time', skipna=True).values
-        data_type = data_array.dtype
-        memory_usage = data_array.nbytes
+    return summaries
 
-        print(f"{var_name}:")
-        print(f"    Mean = {mean_val}, Standard Deviation = {std_val}")
-        print(f"    25th Percentile = {quantiles[0]}, Median = {quantiles[1]}, 75th Percentile = {quantiles[2]}")
-        print(f"    Non-NaN Count = {non_nan_count}, Unique Values = {unique_values_count}")
-        print(f"    Sum = {sum_val}, Data Type = {data_type}")
-        print(f"    Memory Usage = {memory_usage} bytes\n")
+
+def merge_summaries(summaries_list):
+    """
+    Merges summaries computed separately (e.g., per day or per site) into one set of summaries.
+
+    Parameters:
+    - summaries_list: Iterable of dictionaries returned by summarize_dataset.
+
+    Returns:
+    - Dictionary of merged VariableSummary objects keyed by variable name.
+    """
+
+    merged = {}
+    for summaries in summaries_list:
+        for var_name, summary in summaries.items():
+            merged.setdefault(var_name, VariableSummary()).merge(summary)
+    return merged
+
+
+class VariableSummary:
+    """
+    Streaming, mergeable summary statistics for one variable.
+
+    Count, sum, mean, standard deviation, min and max are exact (Chan et al. parallel variance updates).
+    Quantiles come from a bottom-k random sample and are exact until more than sample_size values are seen.
+    The sample keys come from a generator seeded with seed, so the same data always gives the same quantiles.
+    Distinct values are counted exactly up to exact_distinct_max values, then with a HyperLogLog sketch.
+    """
+
+    HLL_PRECISION = 12
+
+    def __init__(self, sample_size=10000, exact_distinct_max=4096, seed=0):
+        self.sample_size = sample_size
+        self.exact_distinct_max = exact_distinct_max
+        self.count = 0
+        self.sum = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+        self.dtype = None
+        self.nbytes = 0
+        self._sample_keys = np.empty(0)
+        self._sample_values = np.empty(0)
+        self._distinct = set()
+        self._registers = None
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        """
+        Adds a chunk of values (any shape) to the summary.
+        """
+
+        values = np.asarray(values)
+        self.dtype = values.dtype if self.dtype is None else np.result_type(self.dtype, values.dtype)
+        self.nbytes += values.nbytes
+
+        values = values.ravel().astype(np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+
+        chunk = VariableSummary(self.sample_size, self.exact_distinct_max)
+        chunk.count = values.size
+        chunk.sum = values.sum()
+        chunk.mean = chunk.sum / chunk.count
+        chunk.m2 = ((values - chunk.mean) ** 2).sum()
+        chunk.min = values.min()
+        chunk.max = values.max()
+        chunk._sample_keys = self._rng.random(values.size)
+        chunk._sample_values = values
+        chunk._add_hashes(_hash_values(values))
+        self.merge(chunk, _dtype=False)
+
+    def merge(self, other, _dtype=True):
+        """
+        Merges another VariableSummary into this one in place and returns self.
+        """
+
+        if _dtype and other.dtype is not None:
+            self.dtype = other.dtype if self.dtype is None else np.result_type(self.dtype, other.dtype)
+            self.nbytes += other.nbytes
+        if other.count == 0:
+            return self
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.sum += other.sum
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+
+        keys = np.concatenate([self._sample_keys, other._sample_keys])
+        values = np.concatenate([self._sample_values, other._sample_values])
+        if keys.size > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+            keys, values = keys[keep], values[keep]
+        self._sample_keys, self._sample_values = keys, values
+
+        if other._registers is not None:
+            self._to_sketch()
+            np.maximum(self._registers, other._registers, out=self._registers)
+        else:
+            self._add_hashes(np.fromiter(other._distinct, dtype=np.uint64, count=len(other._distinct)))
+        return self
+
+    def _add_hashes(self, hashes):
+        if self._registers is None:
+            self._distinct.update(hashes.tolist())
+            if len(self._distinct) <= self.exact_distinct_max:
+                return
+            self._to_sketch()
+            return
+
+        p = self.HLL_PRECISION
+        index = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        remainder = (hashes << np.uint64(p)) | np.uint64(1 << (p - 1))
+        rank = (64 - np.floor(np.log2(remainder.astype(np.float64)))).astype(np.uint8)
+        np.maximum.at(self._registers, index, rank)
+
+    def _to_sketch(self):
+        if self._registers is not None:
+            return
+        self._registers = np.zeros(1 << self.HLL_PRECISION, dtype=np.uint8)
+        distinct, self._distinct = self._distinct, set()
+        self._add_hashes(np.fromiter(distinct, dtype=np.uint64, count=len(distinct)))
+
+    def distinct_count(self):
+        """
+        Exact or HyperLogLog-estimated number of distinct non-NaN values.
+        """
+
+        if self._registers is None:
+            return len(self._distinct)
+
+        m = self._registers.size
+        estimate = 0.7213 / (1 + 1.079 / m) * m**2 / np.sum(2.0 ** -self._registers.astype(np.float64))
+        zeros = np.count_nonzero(self._registers == 0)
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def quantile(self, q):
+        """
+        Exact or sample-estimated quantile(s) q of the non-NaN values.
+        """
+
+        if self._sample_values.size == 0:
+            return np.full(np.shape(q), np.nan)
+        return np.quantile(self._sample_values, q)
+
+    def __repr__(self):
+        if self.count == 0:
+            return f'VariableSummary(count=0, dtype={self.dtype})'
+        stats = self.to_dict()
+        return (f"VariableSummary(count={stats['count']}, mean={stats['mean']:.6g}, std={stats['std']:.6g}, "
+                f"min={stats['min']:.6g}, median={stats['median']:.6g}, max={stats['max']:.6g}, dtype={stats['dtype']})")
+
+    def to_dict(self):
+        """
+        Returns the summary as a plain dictionary of statistics.
+        """
+
+        q25, median, q75 = self.quantile([0.25, 0.5, 0.75])
+        return {'mean': self.mean if self.count else np.nan,
+                'std': np.sqrt(self.m2 / self.count) if self.count else np.nan,
+                'q25': q25, 'median': median, 'q75': q75,
+                'min': self.min, 'max': self.max,
+                'count': self.count, 'unique': self.distinct_count(),
+                'sum': self.sum, 'dtype': self.dtype, 'nbytes': self.nbytes}
+
+
+def _hash_values(values):
+    """
+    64-bit hash of float64 values (splitmix64 finaliser over the bit patterns) for distinct counting.
+    """
+
+    bits = (values + 0.0).view(np.uint64)
+    with np.errstate(over='ignore'):
+        bits = (bits ^ (bits >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        bits = (bits ^ (bits >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return bits ^ (bits >> np.uint64(31))
 
 def get_psd_params(ds):
-    psd_values = ds.particle_size_distributions_psd
+    from scipy.optimize import curve_fit # imported here so the rest of pcalc does not load scipy
+
     bin_centers = ds.particle_size_distributions_bin_centers.values
 
     func = lambda t, a, b: a * np.exp(-b*t)
 
-    block_avg = np.mean(psd_values[:,:], axis=0)
+    count, total, _ = distribution_moments(ds, 'particle_size_distributions_psd')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        block_avg = total / count
     valid_indices = ~np.isnan(block_avg)
     valid_bin_centers = bin_centers[valid_indices]
 
@@ -51,39 +284,775 @@ def get_psd_params(ds):
     ret_lambda = 0
     try:
         popt, pcov = curve_fit(func, valid_bin_centers, block_avg, p0 = [1e4, 2], maxfev=600)
-        if popt[0] > 0 and popt[0] < 10**7 and popt[1] > 0 and popt[1] < 10:
+        if popt[0] > 0 and popt[0] < N0_MAX and popt[1] > 0 and popt[1] < LAMBDA_MAX:
             ret_N0 = popt[0]
             ret_lambda = popt[1]
 
     except FileNotFoundError:
         print("Could not fit PSD curve with available data.")
 
-    particle_count = int(np.nansum(psd_values[:,:], axis=(0, 1)))
+    particle_count = int(np.nansum(total))
     return {'N0': ret_N0, 'lambda': ret_lambda, 'count': particle_count}
 
 
-def split_dataset_by_ed_adj(dataset):
+def distribution_moments(ds, name, chunk_size=10080):
+    """
+    Per-bin count, sum and sum of squares of a 2D distribution variable over time, ignoring NaNs.
+
+    Works on dense and compact (see pread.compact_distributions) datasets, one time chunk at a time.
+
+    Parameters:
+    - ds: xarray.Dataset containing the PIP data.
+    - name: Distribution variable name (e.g., 'particle_size_distributions_psd').
+    - chunk_size: Number of time steps read at once.
+
+    Returns:
+    - Tuple of (count, sum, sum of squares) numpy arrays, one value per bin.
+    """
+
+    n_bins = ds[name].shape[-1]
+    count = np.zeros(n_bins, dtype=np.int64)
+    total = np.zeros(n_bins)
+    total_sq = np.zeros(n_bins)
+
+    for block in pread.distribution_blocks(ds, name, chunk_size):
+        valid = ~np.isnan(block)
+        block = np.where(valid, block, 0).astype(np.float64)
+        count += valid.sum(axis=0)
+        total += block.sum(axis=0)
+        total_sq += (block**2).sum(axis=0)
+
+    return count, total, total_sq
+
+
+def get_psd_params_series(ds, window=None, chunk_size=10080):
+    """
+    Vectorized version of get_psd_params that retrieves N0 and lambda for every minute (or every window of minutes).
+
+    Each spectrum is fit with a weighted log-linear least squares solve of log(psd) = log(N0) - lambda * D
+    over the valid (finite, positive) bins. Weights of psd^2 make this approximate the same squared-error
+    objective curve_fit minimises in get_psd_params, without any per-minute Python loop.
+
+    Parameters:
+    - ds: xarray.Dataset object with PIP microphysical observations and bin centers.
+    - window: Optional window length in minutes; spectra are averaged over each window before fitting.
+    - chunk_size: Number of time steps solved at once, which bounds the temporary memory used.
+
+    Returns:
+    - Dictionary of time-aligned xarray.DataArrays with N0, lambda and particle count (the total over each window
+      when window is given). N0 and lambda are NaN where the fit is undetermined or outside the get_psd_params
+      validity bounds.
+    """
+
+    name = 'particle_size_distributions_psd'
+    psd_ds = ds
+    if window is not None:
+        psd_ds = pread.expand_distributions(ds, [name])[[name]].resample(time=f'{int(window)}min').mean()
+
+    bin_centers = ds.particle_size_distributions_bin_centers.values.astype(np.float64)
+    n_times = psd_ds.sizes['time']
+
+    ret_N0 = np.full(n_times, np.nan)
+    ret_lambda = np.full(n_times, np.nan)
+    particle_count = np.zeros(n_times)
+
+    for start, block in zip(range(0, n_times, chunk_size), pread.distribution_blocks(psd_ds, name, chunk_size)):
+        block = block.astype(np.float64)
+        particle_count[start:start + chunk_size] = np.nansum(block, axis=1)
+
+        valid = np.isfinite(block) & (block > 0)
+        weights = np.where(valid, block, 0.0) ** 2
+        weighted_log_psd = weights * np.log(np.where(valid, block, 1.0))
+
+        s = weights.sum(axis=1)
+        sx = weights @ bin_centers
+        sxx = weights @ bin_centers**2
+        sy = weighted_log_psd.sum(axis=1)
+        sxy = weighted_log_psd @ bin_centers
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            denominator = s * sxx - sx**2
+            slope = (s * sxy - sx * sy) / denominator
+            N0 = np.exp((sy - slope * sx) / s)
+        lam = -slope
+
+        fitted = (valid.sum(axis=1) >= 2) & (denominator > 0)
+        in_bounds = fitted & (N0 > 0) & (N0 < N0_MAX) & (lam > 0) & (lam < LAMBDA_MAX)
+        ret_N0[start:start + chunk_size] = np.where(in_bounds, N0, np.nan)
+        ret_lambda[start:start + chunk_size] = np.where(in_bounds, lam, np.nan)
+
+    time = psd_ds['time']
+    if window is not None:
+        # the window spectra are means, so the counts are summed from the minutes instead
+        minute_count = np.concatenate([np.nansum(block, axis=1) for block in pread.distribution_blocks(ds, name, chunk_size)])
+        window_count = pd.Series(minute_count, index=ds['time'].values).resample(f'{int(window)}min').sum()
+        particle_count = window_count.reindex(time.values, fill_value=0).values
+
+    return {'N0': xr.DataArray(ret_N0, coords={'time': time}, dims='time', name='N0'),
+            'lambda': xr.DataArray(ret_lambda, coords={'time': time}, dims='time', name='lambda'),
+            'count': xr.DataArray(particle_count, coords={'time': time}, dims='time', name='count')}
+
+
+def split_dataset_by_ed_adj(dataset, threshold=0.4):
     """
     Approach to split the input dataset into two subsets based on the condition
     of ed_adj values, aiming to avoid unexpected dimension size changes.
 
     Parameters:
     - dataset: xarray.Dataset containing the data.
+    - threshold: ed_adj value separating snow from rain.
 
     Returns:
-    - low_ed_adj_dataset: Subset of the dataset where ed_adj values are <= 0.4.
-    - high_ed_adj_dataset: Subset of the dataset where ed_adj values are > 0.4.
+    - low_ed_adj_dataset: Subset of the dataset where ed_adj values are <= threshold.
+    - high_ed_adj_dataset: Subset of the dataset where ed_adj values are > threshold.
     """
 
-    low_ed_adj_times = dataset.time.where(dataset.ed_adj <= 0.4, drop=True)
-    high_ed_adj_times = dataset.time.where(dataset.ed_adj > 0.4, drop=True)
+    partition = partition_dataset(dataset, bins=[threshold], labels=['snow', 'rain'])
+    snowfall_ds = partition['snow'] if partition.size('snow') > 0 else None
+    rainfall_ds = partition['rain'] if partition.size('rain') > 0 else None
 
-    snowfall_ds = dataset.sel(time=low_ed_adj_times)
-    rainfall_ds = dataset.sel(time=high_ed_adj_times)
+    return (snowfall_ds, rainfall_ds)
 
-    if len(snowfall_ds.time.values) == 0:
-        snowfall_ds = None
-    if len(rainfall_ds.time.values) == 0:
-        rainfall_ds = None
 
-    return (snowfall_ds, rainfall_ds)
+def partition_dataset(dataset, bins=(0.4,), labels=None, variable='ed_adj', min_rates=None, chunk_size=10080):
+    """
+    Assigns every minute to a class (e.g., snow, mixed, rain) from one pass over a single 1D variable.
+
+    Only a small integer class code per minute is stored; subsets are built on demand from index arrays,
+    so nothing (including the 2D distributions) is copied until a class is actually requested.
+
+    Parameters:
+    - dataset: xarray.Dataset containing the data.
+    - bins: Increasing class edges for variable; class i holds bins[i-1] < value <= bins[i].
+    - labels: Class names, one more than the number of edges (default: snow/rain or snow/mixed/rain).
+    - variable: 1D variable used for the classification.
+    - min_rates: Optional dictionary of minimum rates (e.g., {'nrr_adj': 0.1, 'rr_adj': 0.1}); a minute is only
+                 classified if at least one listed rate reaches its minimum.
+    - chunk_size: Number of time steps read at once.
+
+    Returns:
+    - A Partition object.
+    """
+
+    bins = np.asarray(bins, dtype=np.float64)
+    if labels is None:
+        labels = {1: ['snow', 'rain'], 2: ['snow', 'mixed', 'rain']}.get(bins.size, [f'class_{i}' for i in range(bins.size + 1)])
+    if len(labels) != bins.size + 1:
+        raise ValueError('labels must have exactly one more entry than bins')
+
+    n_times = dataset.sizes['time']
+    codes = np.full(n_times, -1, dtype=np.int8)
+    for start in range(0, n_times, chunk_size):
+        window = slice(start, start + chunk_size)
+        values = dataset[variable].isel(time=window).values
+        chunk_codes = np.digitize(values, bins, right=True).astype(np.int8)
+        valid = ~np.isnan(values)
+
+        if min_rates:
+            active = np.zeros(values.shape, dtype=bool)
+            for rate_name, min_rate in min_rates.items():
+                active |= dataset[rate_name].isel(time=window).values >= min_rate
+            valid &= active
+
+        codes[window] = np.where(valid, chunk_codes, -1)
+
+    return Partition(dataset, codes, labels)
+
+
+class Partition:
+    """
+    Grouped view of a dataset produced by partition_dataset.
+
+    Classes are materialised only when requested (partition['snow']), or streamed chunk by chunk with iter_chunks.
+    """
+
+    def __init__(self, dataset, codes, labels):
+        self.dataset = dataset
+        self.codes = codes
+        self.labels = list(labels)
+
+    def __getitem__(self, label):
+        return self.dataset.isel(time=self.indices(label))
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def indices(self, label):
+        """
+        Integer time positions belonging to a class.
+        """
+
+        return np.flatnonzero(self.codes == self.labels.index(label))
+
+    def size(self, label):
+        """
+        Number of minutes in a class.
+        """
+
+        return int(np.count_nonzero(self.codes == self.labels.index(label)))
+
+    def sizes(self):
+        """
+        Dictionary of the number of minutes in each class.
+        """
+
+        return {label: self.size(label) for label in self.labels}
+
+    def iter_chunks(self, label, chunk_size=10080):
+        """
+        Yields the minutes of a class as datasets, reading chunk_size time steps of the source at a time.
+        """
+
+        code = self.labels.index(label)
+        for start in range(0, self.codes.size, chunk_size):
+            local = np.flatnonzero(self.codes[start:start + chunk_size] == code)
+            if local.size > 0:
+                yield self.dataset.isel(time=local + start)
+
+    def apply(self, func):
+        """
+        Applies func to each non-empty class and returns a dictionary of results keyed by label.
+        """
+
+        return {label: func(self[label]) for label in self.labels if self.size(label) > 0}
+
+
+AGGREGATE_KEYS = ['site', 'year', 'month', 'phase']
+
+def aggregate_distributions(ds, by=None, site='', histograms=None, threshold=0.4, chunk_size=10080):
+    """
+    Per-bin count, sum and sum of squares (and optional value histograms) of the PSD, VVD and rho distributions,
+    for each group of minutes.
+
+    The result is a small xarray.Dataset on a 'group' dimension that can be merged with the aggregates of other
+    days, sites or years (merge_aggregates), saved with to_netcdf, and plotted without the source data.
+
+    Parameters:
+    - ds: xarray.Dataset containing the PIP data (dense or compact layout).
+    - by: Optional group key or list of keys among 'site', 'year', 'month' and 'phase' (default: one 'all' group).
+    - site: Site name recorded for the minutes of ds (used when grouping by site).
+    - histograms: Optional dictionary of histogram edges per distribution variable (e.g., {'velocity_distributions_vvd': np.linspace(0, 3, 31)}).
+    - threshold: ed_adj value separating snow from rain when grouping by phase (see split_dataset_by_ed_adj).
+    - chunk_size: Number of time steps read at once.
+
+    Returns:
+    - An aggregate xarray.Dataset.
+    """
+
+    by = [by] if isinstance(by, str) else list(by or [])
+    n_times = ds.sizes['time']
+
+    components = {'site': np.full(n_times, site, dtype=object)}
+    if 'year' in by or 'month' in by:
+        components['year'] = ds.time.dt.year.values
+        components['month'] = ds.time.dt.month.values
+    if 'phase' in by:
+        partition = partition_dataset(ds, bins=[threshold], labels=['snow', 'rain'], chunk_size=chunk_size)
+        components['phase'] = np.array(['none', 'snow', 'rain'], dtype=object)[partition.codes + 1]
+
+    codes, groups = _factorize_groups(pd.DataFrame({key: components[key] for key in by}, index=range(n_times)), by)
+    n_groups = len(groups)
+
+    aggregate = xr.Dataset(coords=_aggregate_coords(groups, by, site))
+    aggregate['n_times'] = ('group', np.bincount(codes, minlength=n_groups).astype(np.int64))
+
+    for name in pread.COMPACT_VARIABLES:
+        if name not in ds:
+            continue
+        bin_dim = ds[name].dims[-1]
+        n_bins = ds.sizes[bin_dim]
+        edges = None if histograms is None or name not in histograms else np.asarray(histograms[name], dtype=np.float64)
+
+        count = np.zeros((n_groups, n_bins), dtype=np.int64)
+        total = np.zeros((n_groups, n_bins))
+        total_sq = np.zeros((n_groups, n_bins))
+        hist = np.zeros((n_groups, n_bins, edges.size - 1), dtype=np.int64) if edges is not None else None
+
+        start = 0
+        for block in pread.distribution_blocks(ds, name, chunk_size):
+            block_codes = codes[start:start + block.shape[0]]
+            start += block.shape[0]
+            for group in np.unique(block_codes):
+                values = block[block_codes == group]
+                valid = ~np.isnan(values)
+                values = np.where(valid, values, 0).astype(np.float64)
+                count[group] += valid.sum(axis=0)
+                total[group] += values.sum(axis=0)
+                total_sq[group] += (values**2).sum(axis=0)
+                if hist is not None:
+                    hist[group] += _bin_histograms(values, valid, edges)
+
+        aggregate = aggregate.assign_coords({bin_dim: ds[bin_dim].values})
+        aggregate[name + '_count'] = (('group', bin_dim), count)
+        aggregate[name + '_sum'] = (('group', bin_dim), total)
+        aggregate[name + '_sum_sq'] = (('group', bin_dim), total_sq)
+        if hist is not None:
+            aggregate[name + '_hist'] = (('group', bin_dim, name + '_hist_bin'), hist)
+            aggregate[name + '_hist_edges'] = (name + '_hist_edge', edges)
+
+    aggregate.attrs['group_keys'] = ','.join(by)
+    return aggregate
+
+
+def _aggregate_coords(groups, by, site=''):
+    """
+    Group labels and per-key coordinates of an aggregate ('' / 0 for keys not used in the grouping).
+    """
+
+    n_groups = len(groups)
+    coords = {
+        'site': np.array([str(value) for value in groups['site']] if 'site' in by else [site] * n_groups, dtype=str),
+        'year': np.asarray(groups['year'] if 'year' in by else np.zeros(n_groups), dtype=np.int64),
+        'month': np.asarray(groups['month'] if 'month' in by else np.zeros(n_groups), dtype=np.int64),
+        'phase': np.array([str(value) for value in groups['phase']] if 'phase' in by else [''] * n_groups, dtype=str),
+    }
+
+    labels = []
+    for i in range(n_groups):
+        parts = [f'{coords[key][i]:02d}' if key == 'month' else str(coords[key][i]) for key in by]
+        labels.append('/'.join(parts) if parts else 'all')
+
+    coords = {key: ('group', values) for key, values in coords.items()}
+    coords['group'] = np.array(labels, dtype=str)
+    return coords
+
+
+def _factorize_groups(frame, keys):
+    """
+    Group code of every row of frame over the given key columns, and the rows of the first member of each group.
+    """
+
+    if not keys:
+        return np.zeros(len(frame), dtype=np.int64), frame.iloc[:1].reset_index(drop=True)
+    codes = pd.factorize(pd.MultiIndex.from_frame(frame[keys]))[0]
+    first = np.unique(codes, return_index=True)[1]
+    return codes, frame.iloc[first].reset_index(drop=True)
+
+
+def _bin_histograms(values, valid, edges):
+    """
+    Histogram of the values of each bin (column) over the given edges, as an (n_bins, n_edges - 1) count array.
+    """
+
+    n_bins, n_hist = values.shape[1], edges.size - 1
+    index = np.searchsorted(edges, values, side='right') - 1
+    index[values == edges[-1]] = n_hist - 1
+    inside = valid & (index >= 0) & (index < n_hist)
+    flat = (np.arange(n_bins)[None, :] * n_hist + index)[inside]
+    return np.bincount(flat, minlength=n_bins * n_hist).reshape(n_bins, n_hist)
+
+
+def merge_aggregates(aggregates, by=None):
+    """
+    Merges aggregates (see aggregate_distributions) from different days, sites or years by adding their sums.
+
+    Parameters:
+    - aggregates: List of aggregate datasets.
+    - by: Optional subset of the group keys to regroup by (e.g., ['month'] to pool the sites of a by site and month
+          aggregate, or [] to pool everything). By default the existing groups are kept.
+
+    Returns:
+    - The merged aggregate xarray.Dataset.
+    """
+
+    aggregates = [aggregate for aggregate in aggregates if aggregate is not None]
+    if not aggregates:
+        return None
+
+    keys = aggregates[0].attrs.get('group_keys', '')
+    keys = keys.split(',') if keys else []
+    if by is not None:
+        by = [by] if isinstance(by, str) else list(by)
+        if not set(by) <= set(keys):
+            raise ValueError(f'Cannot regroup by {by}: the aggregates are only grouped by {keys}')
+        keys = by
+
+    fixed = {}
+    for aggregate in aggregates:
+        for name, values in aggregate.data_vars.items():
+            if 'group' not in values.dims:
+                if name in fixed and not np.array_equal(fixed[name].values, values.values):
+                    raise ValueError(f'Cannot merge aggregates with different {name}')
+                fixed[name] = values
+
+    merged = xr.concat([aggregate.drop_vars(list(fixed)) for aggregate in aggregates], dim='group', join='outer', fill_value=0)
+    groups = pd.DataFrame({key: merged[key].values for key in AGGREGATE_KEYS})
+    codes, groups = _factorize_groups(groups, keys)
+    sites = np.unique(merged['site'].values)
+
+    result = xr.Dataset(coords=_aggregate_coords(groups, keys, sites[0] if sites.size == 1 else ''))
+    for name, values in merged.data_vars.items():
+        summed = np.zeros((len(groups),) + values.shape[1:], dtype=values.dtype)
+        np.add.at(summed, codes, values.values)
+        result[name] = (values.dims, summed)
+    result = result.assign_coords({dim: merged[dim] for dim in merged.dims if dim != 'group' and dim in merged.coords})
+
+    result = result.assign(fixed)
+    result.attrs['group_keys'] = ','.join(keys)
+    return result
+
+
+def aggregate_statistics(aggregate, name, z=1.96):
+    """
+    Per-bin mean, standard deviation and confidence interval of a distribution variable for every group of an aggregate.
+
+    Parameters:
+    - aggregate: Aggregate xarray.Dataset (see aggregate_distributions).
+    - name: Distribution variable name (e.g., 'particle_size_distributions_psd').
+    - z: Width of the confidence interval in standard errors (1.96 for 95%).
+
+    Returns:
+    - Dictionary of (group, bin) DataArrays: mean, std, ci_lower and ci_upper.
+    """
+
+    count, total, total_sq = (aggregate[name + suffix] for suffix in ['_count', '_sum', '_sum_sq'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = total / count
+        std = np.sqrt(np.maximum(total_sq / count - means**2, 0))
+    error = z * std / np.sqrt(aggregate['n_times'])
+    return {'mean': means, 'std': std, 'ci_lower': means - error, 'ci_upper': means + error}
+
+
+def aggregate_archive(sites, by=None, histograms=None, threshold=0.4, main_path=None, n_jobs=None, catalog=None, output=None,
+                      days=None, minutes=None):
+    """
+    Map-reduce aggregation of the PSD, VVD and rho distributions over every day of the given sites.
+
+    Each day is aggregated on its own in a pool of worker processes and the partial aggregates are merged,
+    so no more than one day per worker is held in memory.
+
+    Parameters:
+    - sites: A site name or list of sites.
+    - by: Optional group key or list of keys among 'site', 'year', 'month' and 'phase'.
+    - histograms: Optional dictionary of histogram edges per distribution variable.
+    - threshold: ed_adj value separating snow from rain when grouping by phase.
+    - main_path: The main directory path where YEAR_SITE subfolders are located (default: the catalog's, else pconfig.MAIN_PATH).
+    - n_jobs: Number of worker processes (default: one per CPU; 1 runs serially in this process).
+    - catalog: Optional pcatalog.Catalog used for file lookups instead of the filesystem.
+    - output: Optional NetCDF path the merged aggregate is written to.
+    - days, minutes: Optional day and minute filters answered from the catalog's availability index (see pread.load_range).
+
+    Returns:
+    - The merged aggregate xarray.Dataset.
+    """
+
+    tasks = pread._list_days(sites, main_path=main_path, catalog=catalog, days=days, minutes=minutes)
+    aggregate_day = partial(_aggregate_day, by=by, histograms=histograms, threshold=threshold, catalog=catalog, minutes=minutes)
+
+    if n_jobs == 1 or len(tasks) <= 1:
+        partials = map(aggregate_day, tasks)
+        aggregate = _merge_stream(partials)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as workers:
+            aggregate = _merge_stream(workers.map(aggregate_day, tasks, chunksize=4))
+
+    if output is not None and aggregate is not None:
+        aggregate.to_netcdf(output)
+    return aggregate
+
+
+def _aggregate_day(task, by, histograms, threshold, catalog=None, minutes=None):
+    """
+    Loads one site-day (see pread._list_days) and returns its aggregate, or None if its files are missing.
+    """
+
+    date, site, base_dir, prefix = task
+    ds = pread._load_day(base_dir, prefix, pread.FILE_PATTERNS, catalog=catalog, strict=True, minutes=minutes)
+    return aggregate_distributions(ds, by, site, histograms, threshold) if ds is not None else None
+
+
+def _merge_stream(partials, batch_size=64):
+    """
+    Merges a stream of partial aggregates in batches so only batch_size of them are held at once.
+    """
+
+    merged, batch = None, []
+    for aggregate in partials:
+        batch.append(aggregate)
+        if len(batch) >= batch_size:
+            merged = merge_aggregates([merged] + batch)
+            batch = []
+    return merge_aggregates([merged] + batch)
+
+
+COMPARISON_PAIRS = {
+    'ed': ('edensity_lwe_rate_ed', 'rho_mean'),
+    'ed_adj': ('ed_adj', 'rho_mean'),
+    'rr': ('edensity_lwe_rate_rr', 'rr_adj'),
+    'nrr': ('edensity_lwe_rate_nrr', 'nrr_adj'),
+}
+COMPARISON_STATISTICS = ['n', 'sum_x', 'sum_y', 'sum_xx', 'sum_yy', 'sum_xy']
+
+def comparison_histograms(ds, bins=200, limits=None, chunk_size=10080):
+    """
+    Bins the original vs adjusted pairs plotted by pplot.compare_adjusted_values (L4 vs adjusted effective density
+    against the mean rho, and the original vs adjusted rain and snow rates) into 2D histograms in one vectorized pass.
+
+    Grids built with the same bins and limits can be added together (see merge_comparison_histograms), so several
+    site-years can be plotted at once from their grids. The default rate limits depend on the data, so pass explicit
+    limits for grids that are to be merged.
+
+    Parameters:
+    - ds: xarray.Dataset containing the PIP data (dense or compact layout).
+    - bins: Number of histogram bins along each axis.
+    - limits: Optional dictionary of (low, high) axis limits per pair ('ed', 'ed_adj', 'rr', 'nrr'). By default the
+              density pairs use (0, 0.4) and the rate pairs (0, max of the original rate).
+    - chunk_size: Number of time steps read at once.
+
+    Returns:
+    - An xarray.Dataset with <pair>_counts (x, y) histograms, their <pair>_x_edges and <pair>_y_edges, and
+      <pair>_n, _sum_x, _sum_y, _sum_xx, _sum_yy and _sum_xy of the valid pairs.
+    """
+
+    # mean of the non-zero rho bins of each minute
+    rho_mean = []
+    if 'edensity_distributions_rho' in ds:
+        for block in pread.distribution_blocks(ds, 'edensity_distributions_rho', chunk_size):
+            counted = ~np.isnan(block) & (block != 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rho_mean.append(np.where(counted, block, 0).sum(axis=1) / counted.sum(axis=1))
+    columns = {'rho_mean': np.concatenate(rho_mean)} if rho_mean else {}
+
+    grids = xr.Dataset()
+    for pair, (x_name, y_name) in COMPARISON_PAIRS.items():
+        if x_name not in ds or (y_name not in columns and y_name not in ds):
+            continue
+        x = ds[x_name].values.astype(np.float64)
+        y = columns[y_name] if y_name in columns else ds[y_name].values.astype(np.float64)
+        valid = ~np.isnan(x) & ~np.isnan(y)
+        x, y = x[valid], y[valid]
+
+        if limits is not None and pair in limits:
+            low, high = limits[pair]
+        elif pair in ['ed', 'ed_adj']:
+            low, high = 0, 0.4
+        else:
+            low, high = 0, float(x.max()) if x.size > 0 and x.max() > 0 else 1.0
+        edges = np.linspace(low, high, bins + 1)
+
+        counts, _, _ = np.histogram2d(x, y, bins=[edges, edges])
+        grids[f'{pair}_counts'] = ((f'{pair}_x', f'{pair}_y'), counts.astype(np.int64))
+        grids[f'{pair}_x_edges'] = (f'{pair}_x_edge', edges)
+        grids[f'{pair}_y_edges'] = (f'{pair}_y_edge', edges)
+        for statistic, value in zip(COMPARISON_STATISTICS, [x.size, x.sum(), y.sum(), (x * x).sum(), (y * y).sum(), (x * y).sum()]):
+            grids[f'{pair}_{statistic}'] = value
+    return grids
+
+
+def merge_comparison_histograms(grids):
+    """
+    Adds comparison grids (see comparison_histograms) from several days, sites or years.
+
+    Parameters:
+    - grids: List of grid datasets, built with the same bins and limits.
+
+    Returns:
+    - The merged grid xarray.Dataset.
+    """
+
+    grids = [grid for grid in grids if grid is not None]
+    if not grids:
+        return None
+
+    merged = grids[0].copy(deep=True)
+    for grid in grids[1:]:
+        for name in grid.data_vars:
+            if name.endswith('_edges') and name in merged and not np.array_equal(merged[name].values, grid[name].values):
+                raise ValueError(f'Cannot merge comparison grids with different {name} (use the same bins and limits)')
+        for name in grid.data_vars:
+            if name not in merged:
+                merged[name] = grid[name]
+            elif not name.endswith('_edges'):
+                merged[name] = merged[name] + grid[name]
+    return merged
+
+
+def comparison_statistics(grids, pair):
+    """
+    Mean bias (adjusted - original), RMSE and correlation of a pair from the sums kept in its comparison grid.
+
+    Parameters:
+    - grids: Grid dataset (see comparison_histograms).
+    - pair: Pair name ('ed', 'ed_adj', 'rr' or 'nrr').
+
+    Returns:
+    - Dictionary with n, bias, rmse and r.
+    """
+
+    n, sum_x, sum_y, sum_xx, sum_yy, sum_xy = (float(grids[f'{pair}_{statistic}']) for statistic in COMPARISON_STATISTICS)
+    if n == 0:
+        return {'n': 0, 'bias': np.nan, 'rmse': np.nan, 'r': np.nan}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = sum_xy / n - sum_x * sum_y / n**2
+        r = covariance / np.sqrt(max(sum_xx / n - (sum_x / n)**2, 0) * max(sum_yy / n - (sum_y / n)**2, 0))
+    rmse = np.sqrt(max((sum_yy - 2 * sum_xy + sum_xx) / n, 0))
+    return {'n': int(n), 'bias': (sum_y - sum_x) / n, 'rmse': rmse, 'r': r}
+
+
+DERIVED_PRODUCTS = ['particle_size_distributions', 'edensity_distributions', 'velocity_distributions']
+
+DERIVED_VARIABLES = {
+    'Nt': 'Total number concentration (m-3)',
+    'Dm': 'Mass-weighted mean diameter M4 / M3 (mm)',
+    'mass': 'Density-weighted particle mass, sum of pi / 6 rho D^3 N(D) dD (g m-3)',
+    'swe_rate': 'Liquid-equivalent rate from the PSD, rho and VVD, 6 pi 10^-4 sum of rho D^3 v N(D) dD (mm hr-1)',
+}
+
+def derived_microphysics(ds, moments=(0, 1, 2, 3, 4, 6), chunk_size=10080):
+    """
+    Per-minute total number concentration, PSD moments, mass-weighted mean diameter, density-weighted mass and
+    liquid-equivalent rate (see DERIVED_VARIABLES) from the PSD, rho and VVD distributions.
+
+    The distributions are combined over their shared bin axis one time chunk at a time, so the temporary memory
+    is bounded by chunk_size whatever the length of the dataset. The bin widths come from the <product>_bin_edges
+    variable of the files when it is present and are derived from the bin centers otherwise.
+
+    Parameters:
+    - ds: xarray.Dataset containing the PIP data (dense or compact layout). rho and vvd are optional; mass and
+          swe_rate are only computed when they are present.
+    - moments: Orders k of the PSD moments M<k> = sum of N(D) D^k dD (mm^k m-3) to return.
+    - chunk_size: Number of time steps read at once.
+
+    Returns:
+    - An xarray.Dataset on the time axis of ds with Nt, Dm, M<k>, and mass and swe_rate if available.
+      Minutes without a PSD are NaN.
+    """
+
+    psd_name, rho_name, vvd_name = [f'{product}_{variable}' for product, variable in
+                                    zip(DERIVED_PRODUCTS, ['psd', 'rho', 'vvd'])]
+    if psd_name not in ds:
+        raise ValueError(f'{psd_name} is needed to derive the microphysics')
+
+    centers = ds[f'{DERIVED_PRODUCTS[0]}_bin_centers'].values.astype(np.float64)
+    widths = np.diff(_bin_edges(ds, DERIVED_PRODUCTS[0]))
+    names = [name for name in [rho_name, vvd_name] if name in ds]
+    for name, product in zip([rho_name, vvd_name], DERIVED_PRODUCTS[1:]):
+        if name in names and not np.allclose(ds[f'{product}_bin_centers'].values, centers):
+            raise ValueError(f'{name} and {psd_name} do not share the same bins')
+
+    # every quantity is a weighted sum over bins, so each is a matrix-vector product per chunk
+    orders = sorted(set(moments) | {0, 3, 4})
+    powers = {k: centers**k * widths for k in orders}
+    volume = np.pi / 6 * centers**3 * widths
+
+    n_times = ds.sizes['time']
+    columns = {name: np.full(n_times, np.nan) for name in ['Nt', 'Dm'] + [f'M{k}' for k in moments]}
+    if rho_name in names:
+        columns['mass'] = np.full(n_times, np.nan)
+        if vvd_name in names:
+            columns['swe_rate'] = np.full(n_times, np.nan)
+
+    blocks = zip(*[pread.distribution_blocks(ds, name, chunk_size) for name in [psd_name] + names])
+    for start, (psd, *others) in zip(range(0, n_times, chunk_size), blocks):
+        stop = start + psd.shape[0]
+        observed = ~np.all(np.isnan(psd), axis=1)
+        psd = np.nan_to_num(psd.astype(np.float64))
+
+        sums = {k: np.where(observed, psd @ powers[k], np.nan) for k in orders}
+        columns['Nt'][start:stop] = sums[0]
+        for k in moments:
+            columns[f'M{k}'][start:stop] = sums[k]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            columns['Dm'][start:stop] = np.where(sums[3] > 0, sums[4] / sums[3], np.nan)
+
+        if 'mass' in columns:
+            # rho in g cm-3 and D in mm, so pi / 6 rho D^3 is 10^-3 g per particle
+            weighted = psd * np.nan_to_num(others[0].astype(np.float64))
+            columns['mass'][start:stop] = np.where(observed, 1e-3 * (weighted @ volume), np.nan)
+            if 'swe_rate' in columns:
+                flux = (weighted * np.nan_to_num(others[1].astype(np.float64))) @ volume
+                columns['swe_rate'][start:stop] = np.where(observed, 3.6e-3 * flux, np.nan)
+
+    derived = xr.Dataset({name: ('time', values) for name, values in columns.items()}, coords={'time': ds['time'].values})
+    for name in derived.data_vars:
+        description = DERIVED_VARIABLES.get(name, f'PSD moment of order {name[1:]} (mm^{name[1:]} m-3)')
+        derived[name].attrs['description'] = description
+    return derived
+
+
+def derived_archive(sites, start=None, end=None, moments=(0, 1, 2, 3, 4, 6), main_path=None, n_jobs=None, catalog=None,
+                    cache_dir=None, days=None, minutes=None):
+    """
+    Derived microphysics (see derived_microphysics) for every day of the given sites, memoized per site-day.
+
+    The days are processed in a pool of worker processes, each loading only the PSD, rho and VVD files of one
+    day, so memory stays bounded by a day per worker. Each site-day is saved in cache_dir with a signature of
+    its source files and of the moments, and later calls only recompute the days that are new or changed.
+
+    Parameters:
+    - sites: A site name or list of sites.
+    - start, end: Optional first and last dates (e.g., '2018-01-15'), inclusive.
+    - moments: Orders of the PSD moments to return.
+    - main_path: The main directory path where YEAR_SITE subfolders are located (default: the catalog's, else pconfig.MAIN_PATH).
+    - n_jobs: Number of worker processes (default: one per CPU; 1 runs serially in this process).
+    - catalog: Optional pcatalog.Catalog used for file lookups instead of the filesystem.
+    - cache_dir: Directory of the per site-day results (default: pipdb_derived in pconfig.archive_cache_dir(main_path)).
+    - days, minutes: Optional day and minute filters answered from the catalog's availability index
+                     (see pread.load_range). The minutes filter is part of the memoized signature.
+
+    Returns:
+    - A dictionary of time-indexed xarray.Datasets keyed by site.
+    """
+
+    main_path = pread._resolve_main_path(main_path, catalog)
+    cache_dir = cache_dir if cache_dir is not None else os.path.join(pconfig.archive_cache_dir(main_path), 'pipdb_derived')
+    file_patterns = {product: pread.FILE_PATTERNS[product] for product in DERIVED_PRODUCTS}
+
+    start = pd.Timestamp(start).strftime('%Y%m%d') if start is not None else None
+    end = pd.Timestamp(end).strftime('%Y%m%d') if end is not None else None
+    tasks = pread._list_days(sites, start, end, file_patterns, main_path=main_path, catalog=catalog, days=days, minutes=minutes)
+    derive_day = partial(_derived_day, moments=tuple(moments), catalog=catalog, cache_dir=cache_dir, minutes=minutes)
+
+    if n_jobs == 1 or len(tasks) <= 1:
+        results = list(map(derive_day, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as workers:
+            results = list(workers.map(derive_day, tasks, chunksize=4))
+
+    by_site = {}
+    for (_, site, _, _), derived in zip(tasks, results):
+        if derived is not None:
+            by_site.setdefault(site, []).append(derived)
+    return {site: xr.concat(days_derived, dim='time') for site, days_derived in by_site.items()}
+
+
+def _derived_day(task, moments, catalog=None, cache_dir=None, minutes=None):
+    """
+    Returns the derived microphysics of one site-day (see pread._list_days) from cache_dir if its source files
+    are unchanged, otherwise computes and saves them. Returns None if the files of the day are missing.
+    """
+
+    date, site, base_dir, prefix = task
+    file_patterns = {product: pread.FILE_PATTERNS[product] for product in DERIVED_PRODUCTS}
+    day_patterns = {product: pattern.replace('*', prefix + '*') for product, pattern in file_patterns.items()}
+    signature = pcache.source_signature(base_dir, day_patterns, catalog) + f':{",".join(map(str, moments))}:{minutes}'
+
+    if cache_dir is not None:
+        cached = pcache.read_cached(cache_dir, site, date, signature, variant='derived')
+        if cached is not None:
+            with cached:
+                return cached.load()
+
+    ds = pread._load_day(base_dir, prefix, file_patterns, catalog=catalog, strict=True, minutes=minutes)
+    if ds is None:
+        return None
+    derived = derived_microphysics(ds, moments)
+    if cache_dir is not None:
+        pcache.write_cached(derived, cache_dir, site, date, signature, variant='derived')
+    return derived
+
+
+def _bin_edges(ds, product):
+    """
+    Bin edges of a distribution product, read from <product>_bin_edges if the files have them or placed halfway
+    between the bin centers otherwise (the outer edges mirror the neighbouring half-width).
+    """
+
+    centers = ds[f'{product}_bin_centers'].values.astype(np.float64)
+    name = f'{product}_bin_edges'
+    if name in ds and ds[name].size == centers.size + 1:
+        return ds[name].values.astype(np.float64).ravel()
+
+    middle = (centers[1:] + centers[:-1]) / 2
+    return np.concatenate([[2 * centers[0] - middle[0]], middle, [2 * centers[-1] - middle[-1]]])
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+
+"""pcatalog.py: utility resource for indexing the PIP data tree so file lookups avoid repeated directory scans."""
+
+__author__      = "Fraser King"
+__year__        = "2024"
+__institution__   = "University of Michigan"
+
+import sqlite3
+import threading
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from . import pconfig
+
+MINUTES_PER_DAY = 1440
+PRECIP_PRODUCT = 'adjusted_edensity_lwe_rate' # product directory holding rr_adj and nrr_adj
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    year_site TEXT NOT NULL,
+    site TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    product TEXT NOT NULL,
+    instrument TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_directory ON files (directory);
+CREATE INDEX IF NOT EXISTS files_site_date ON files (site, date);
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS availability (
+    path TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    date TEXT NOT NULL,
+    product TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    valid_minutes INTEGER NOT NULL,
+    precip_minutes INTEGER,
+    valid BLOB NOT NULL,
+    precip BLOB
+);
+CREATE INDEX IF NOT EXISTS availability_site_date ON availability (site, date);
+"""
+
+
+class Catalog:
+    """
+    SQLite index of every daily NetCDF file below MAIN_PATH.
+
+    Each row records the site, year, date, product, instrument number, path, size and mtime of one file.
+    Loaders in pread accept a catalog and answer their glob lookups from it instead of the filesystem.
+
+    The catalog also keeps a per-file availability index (see update_availability): a bitmap of the minutes
+    holding valid data and, for the rate files, of the minutes with precipitation.
+    """
+
+    def __init__(self, main_path=None, db_path=None):
+        """
+        Parameters:
+        - main_path: The main directory path where YEAR_SITE subfolders are located (default: pconfig.MAIN_PATH).
+        - db_path: Location of the SQLite file (default: pipdb_catalog.sqlite in pconfig.archive_cache_dir(main_path)).
+        """
+
+        self.main_path = os.path.abspath(main_path if main_path is not None else pconfig.MAIN_PATH)
+        self.db_path = db_path if db_path is not None else os.path.join(pconfig.archive_cache_dir(self.main_path), 'pipdb_catalog.sqlite')
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._connect()
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    def __getstate__(self):
+        return {'main_path': self.main_path, 'db_path': self.db_path}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._connect()
+
+    def close(self):
+        self._conn.close()
+
+    def refresh(self, full=False):
+        """
+        Brings the catalog up to date with the filesystem.
+
+        Every product directory is listed with one scandir, and its rows are only rewritten when a file was added,
+        removed, resized or modified. A file rewritten in place keeps its directory's mtime, so the files are
+        re-stat-ed rather than trusting the directory mtime; otherwise stale sizes and mtimes would leave the
+        source signatures (see pcache.source_signature) unchanged and cached data would be served.
+
+        Parameters:
+        - full: If True, rewrite the rows of every directory.
+
+        Returns:
+        - Number of product directories whose rows were updated.
+        """
+
+        known = dict(self._query('SELECT path, mtime FROM directories'))
+        seen = set()
+        scanned = 0
+
+        for year_site in sorted(os.listdir(self.main_path)):
+            netcdf_dir = os.path.join(self.main_path, year_site, 'netCDF')
+            if '_' not in year_site or not os.path.isdir(netcdf_dir):
+                continue
+
+            for product in sorted(os.listdir(netcdf_dir)):
+                directory = os.path.join(netcdf_dir, product)
+                if not os.path.isdir(directory):
+                    continue
+
+                seen.add(directory)
+                mtime = os.stat(directory).st_mtime_ns
+                if self._scan_directory(directory, year_site, product, mtime, full or known.get(directory) != mtime):
+                    scanned += 1
+
+        with self._lock, self._conn:
+            for directory in set(known) - seen:
+                self._conn.execute('DELETE FROM files WHERE directory = ?', (directory,))
+                self._conn.execute('DELETE FROM directories WHERE path = ?', (directory,))
+
+        return scanned
+
+    def _scan_directory(self, directory, year_site, product, mtime, force=False):
+        """
+        Lists one product directory and rewrites its rows if anything changed (or force is set).
+
+        Returns:
+        - True if the rows were rewritten.
+        """
+
+        year, site = year_site.split('_', 1)
+        rows = []
+        for entry in os.scandir(directory):
+            if not entry.name.endswith('.nc') or not entry.is_file():
+                continue
+            prefix = entry.name.split('_')[0]
+            stat = entry.stat()
+            rows.append((entry.path, directory, year_site, site, int(year), prefix[-8:], product,
+                         prefix[:-8], stat.st_size, stat.st_mtime_ns))
+
+        if not force:
+            known = set(self._query('SELECT path, size, mtime FROM files WHERE directory = ?', (directory,)))
+            if known == {(row[0], row[8], row[9]) for row in rows}:
+                return False
+
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM files WHERE directory = ?', (directory,))
+            self._conn.executemany('INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self._conn.execute('INSERT OR REPLACE INTO directories VALUES (?, ?)', (directory, mtime))
+        return True
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def glob(self, pattern):
+        """
+        Drop-in replacement for glob.glob, answered from the catalog.
+
+        Parameters:
+        - pattern: Shell-style file pattern (e.g., 'base_dir/particle_size_distributions/*20180101*.nc').
+
+        Returns:
+        - Sorted list of matching file paths.
+        """
+
+        return [row[0] for row in self._query('SELECT path FROM files WHERE path GLOB ? ORDER BY path',
+                                              (os.path.abspath(pattern),))]
+
+    def stat(self, pattern):
+        """
+        Returns (path, size, mtime) for each catalogued file matching pattern.
+        """
+
+        return self._query('SELECT path, size, mtime FROM files WHERE path GLOB ? ORDER BY path',
+                           (os.path.abspath(pattern),))
+
+    def update_availability(self, sites=None, n_jobs=None, full=False):
+        """
+        Brings the availability index up to date with the catalogued files.
+
+        Only files that are new or whose size or mtime changed are read; rows of removed files are dropped.
+        Run refresh first so the catalog itself is current.
+
+        Parameters:
+        - sites: Optional site name or list of sites to update (default: all).
+        - n_jobs: Number of worker processes (default: one per CPU; 1 reads serially in this process).
+        - full: If True, re-read every file.
+
+        Returns:
+        - Number of files that were (re-)indexed.
+        """
+
+        sites = [sites] if isinstance(sites, str) else sites
+        site_filter = f" AND f.site IN ({','.join('?' * len(sites))})" if sites else ''
+        stale = '' if full else ' AND (a.path IS NULL OR a.size != f.size OR a.mtime != f.mtime)'
+        todo = self._query('SELECT f.path, f.site, f.date, f.product, f.size, f.mtime FROM files f '
+                           'LEFT JOIN availability a ON a.path = f.path WHERE 1' + stale + site_filter, tuple(sites or ()))
+
+        if n_jobs == 1 or len(todo) <= 1:
+            bitmaps = [_file_availability(row[0], row[3]) for row in todo]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as workers:
+                bitmaps = list(workers.map(_file_availability, [row[0] for row in todo], [row[3] for row in todo], chunksize=16))
+
+        rows = []
+        for (path, site, date, product, size, mtime), (valid, precip) in zip(todo, bitmaps):
+            rows.append((path, site, date, product, size, mtime, int(valid.sum()),
+                         int(precip.sum()) if precip is not None else None,
+                         np.packbits(valid).tobytes(), np.packbits(precip).tobytes() if precip is not None else None))
+
+        with self._lock, self._conn:
+            self._conn.executemany('INSERT OR REPLACE INTO availability VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self._conn.execute('DELETE FROM availability WHERE path NOT IN (SELECT path FROM files)')
+        return len(rows)
+
+    def available_dates(self, site, require='data', products=None):
+        """
+        Returns the sorted list of dates (YYYYMMDD) of a site that pass a day filter, updating the availability
+        index for the site first.
+
+        Parameters:
+        - site: Site name.
+        - require: 'data' for days where any of the products holds at least one valid minute, or
+                   'precip' for days with at least one precipitating minute (rr_adj + nrr_adj > 0).
+        - products: Optional list of product directories considered for 'data' (default: all).
+
+        Returns:
+        - Sorted list of YYYYMMDD strings.
+        """
+
+        if require not in ['data', 'precip']:
+            raise ValueError(f"require must be 'data' or 'precip', not {require!r}")
+        self.update_availability(site)
+
+        if require == 'precip':
+            rows = self._query('SELECT DISTINCT date FROM availability WHERE site = ? AND product = ? AND precip_minutes > 0 '
+                               'ORDER BY date', (site, PRECIP_PRODUCT))
+        elif products is not None:
+            products = list(products)
+            rows = self._query(f"SELECT DISTINCT date FROM availability WHERE site = ? AND valid_minutes > 0 "
+                               f"AND product IN ({','.join('?' * len(products))}) ORDER BY date", (site, *products))
+        else:
+            rows = self._query('SELECT DISTINCT date FROM availability WHERE site = ? AND valid_minutes > 0 ORDER BY date', (site,))
+        return [row[0] for row in rows]
+
+    def minute_mask(self, pattern, kind='valid'):
+        """
+        Returns the 1440-minute availability bitmap of the files matching pattern (combined with a logical or),
+        or None if none of them is indexed.
+
+        Parameters:
+        - pattern: Shell-style file pattern (e.g., 'base_dir/particle_size_distributions/*20180101*.nc').
+        - kind: 'valid' for minutes holding valid data, or 'precip' for precipitating minutes (rate files only).
+
+        Returns:
+        - A boolean numpy array with one value per minute of the day, or None.
+        """
+
+        if kind not in ['valid', 'precip']:
+            raise ValueError(f"kind must be 'valid' or 'precip', not {kind!r}")
+        rows = self._query(f'SELECT {kind} FROM availability WHERE path GLOB ? AND {kind} IS NOT NULL', (os.path.abspath(pattern),))
+        if not rows:
+            return None
+        masks = [np.unpackbits(np.frombuffer(row[0], dtype=np.uint8))[:MINUTES_PER_DAY].astype(bool) for row in rows]
+        return np.logical_or.reduce(masks)
+
+    def year_sites(self):
+        """
+        Returns the sorted list of YEAR_SITE folders present in the catalog.
+        """
+
+        return [row[0] for row in self._query('SELECT DISTINCT year_site FROM files ORDER BY year_site')]
+
+    def dates(self, site, product=None):
+        """
+        Returns the sorted list of dates (YYYYMMDD) with data at a site, optionally for one product directory.
+        """
+
+        if product is None:
+            rows = self._query('SELECT DISTINCT date FROM files WHERE site = ? ORDER BY date', (site,))
+        else:
+            rows = self._query('SELECT DISTINCT date FROM files WHERE site = ? AND product = ? ORDER BY date', (site, product))
+        return [row[0] for row in rows]
+
+
+
+def _file_availability(path, product):
+    """
+    Reads one daily file and returns its (valid, precip) minute bitmaps; precip is None except for the rate files.
+    """
+
+    import xarray as xr # imported here so opening a catalog does not load xarray
+
+    valid = np.zeros(MINUTES_PER_DAY, dtype=bool)
+    precip = np.zeros(MINUTES_PER_DAY, dtype=bool) if product == PRECIP_PRODUCT else None
+
+    with xr.open_dataset(path) as data:
+        minutes = (data.time.dt.hour * 60 + data.time.dt.minute).values
+        for name, variable in data.data_vars.items():
+            if 'time' not in variable.dims or name in ['lat', 'lon']:
+                continue
+            values = variable.transpose('time', ...).values
+            valid[minutes] |= ~np.isnan(values).reshape(len(minutes), -1).all(axis=1)
+        if precip is not None:
+            rate = sum(np.nan_to_num(data[name].values) for name in ['rr_adj', 'nrr_adj'] if name in data)
+            precip[minutes] = np.asarray(rate) > 0
+    return valid, precip
+
+
+
+def open_catalog(main_path=None, db_path=None, refresh=True):
+    """
+    Opens (and by default incrementally refreshes) the file catalog for a PIP data tree.
+
+    Parameters:
+    - main_path: The main directory path where YEAR_SITE subfolders are located (default: pconfig.MAIN_PATH).
+    - db_path: Location of the SQLite file (default: pipdb_catalog.sqlite in pconfig.archive_cache_dir(main_path)).
+    - refresh: If True, sync the catalog with any files that changed since the last refresh.
+
+    Returns:
+    - A Catalog object that can be passed to the pread loaders.
+    """
+
+    catalog = Catalog(main_path, db_path)
+    if refresh:
+        catalog.refresh()
+    return catalog
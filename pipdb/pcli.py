@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+"""pcli.py: command line entry point for building the daily PIP summary table."""
+
+__author__      = "Fraser King"
+__year__        = "2024"
+__institution__   = "University of Michigan"
+
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from . import pread
+from . import pcache
+from . import pcalc
+from . import pcatalog
+from . import pconfig
+
+SUMMARY_PATTERNS = {
+    'edensity_lwe_rate': pread.FILE_PATTERNS['edensity_lwe_rate'],
+    'particle_size_distributions': pread.FILE_PATTERNS['particle_size_distributions'],
+}
+
+SUMMARY_COLUMNS = {
+    'N0': 'Exponential PSD intercept from get_psd_params (0 if the fit failed, NaN without PSD files)',
+    'lambda': 'Exponential PSD slope from get_psd_params (0 if the fit failed, NaN without PSD files)',
+    'count': 'Total particle count from get_psd_params',
+    'rain_total': 'Daily rr_adj accumulation (mm, from one-minute mm hr-1 rates)',
+    'snow_total': 'Daily nrr_adj accumulation (mm, from one-minute mm hr-1 rates)',
+    'ed_adj_mean': 'Mean adjusted effective density over precipitating minutes (g cm-3)',
+}
+
+
+def update_daily_summaries(output=None, main_path=None, sites=None, n_jobs=None, catalog=None, full=False):
+    """
+    Computes per site-day N0, lambda, particle count, rain and snow totals and mean ed_adj, and stores them in a
+    NetCDF table with one row per site-day.
+
+    Each row keeps a signature of the files it was computed from, so later runs only process the days
+    that are new or whose files changed, and drop the days whose files were removed.
+
+    Parameters:
+    - output: Path of the summary table (default: pipdb_daily_summaries.nc in pconfig.archive_cache_dir(main_path)).
+    - main_path: The main directory path where YEAR_SITE subfolders are located (default: the catalog's, else pconfig.MAIN_PATH).
+    - sites: Optional list of sites to update (default: every site found). Rows of the other sites are kept as they are.
+    - n_jobs: Number of worker processes (default: one per CPU; 1 runs serially in this process).
+    - catalog: Optional pcatalog.Catalog used for file lookups instead of the filesystem.
+    - full: If True, recompute every day.
+
+    Returns:
+    - A pandas.DataFrame with the full table (columns site, date, N0, lambda, count, rain_total, snow_total,
+      ed_adj_mean and signature).
+    """
+
+    main_path = pread._resolve_main_path(main_path, catalog)
+    output = output if output is not None else os.path.join(pconfig.archive_cache_dir(main_path), 'pipdb_daily_summaries.nc')
+
+    days = _list_days(main_path, sites, catalog)
+
+    existing = pcache.read_table(output)
+    if existing is not None:
+        # rows of sites outside this run are copied through, the others are kept only if their files are unchanged
+        updated = np.ones(len(existing), dtype=bool) if sites is None else existing['site'].isin(sites).values
+        unchanged = [not full and days.get((row.site, row.date.strftime('%Y%m%d')), (None, None))[1] == row.signature
+                     for row in existing.itertuples()]
+        kept = existing[~updated | np.array(unchanged, dtype=bool)]
+        done = {(row.site, row.date.strftime('%Y%m%d')) for row in existing[updated & np.array(unchanged, dtype=bool)].itertuples()}
+        removed = len(existing) - len(kept)
+    else:
+        kept, done, removed = None, set(), 0
+
+    todo = [(site, date, base_dir, signature) for (site, date), (base_dir, signature) in sorted(days.items()) if (site, date) not in done]
+    summarize_day = partial(_summarize_day, catalog=catalog)
+    if n_jobs == 1 or len(todo) <= 1:
+        rows = [summarize_day(task) for task in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as workers:
+            rows = list(workers.map(summarize_day, todo, chunksize=8))
+
+    table = pd.DataFrame(rows, columns=['site', 'date', *SUMMARY_COLUMNS, 'signature'])
+    table['date'] = pd.to_datetime(table['date'], format='%Y%m%d')
+    if kept is not None and len(kept) > 0:
+        table = pd.concat([kept, table], ignore_index=True) if len(table) > 0 else kept
+    table = table.sort_values(['site', 'date'], ignore_index=True)
+
+    table['count'] = table['count'].astype(np.int64)
+    pcache.write_table(table, output, SUMMARY_COLUMNS)
+    print(f'Summarized: {len(todo)} new or changed site-days ({len(done)} unchanged, {removed} outdated or removed) -> {output}')
+    return table
+
+
+
+def _list_days(main_path, sites=None, catalog=None):
+    """
+    Maps (site, YYYYMMDD) to the netCDF folder holding its files and their source signature (see pcache.source_signature).
+    """
+
+    if catalog is not None:
+        year_site_dirs = catalog.year_sites()
+    else:
+        year_site_dirs = [d for d in os.listdir(main_path) if os.path.isdir(os.path.join(main_path, d, 'netCDF'))]
+
+    days = {}
+    for year_site in sorted(year_site_dirs):
+        if '_' not in year_site:
+            continue
+        site = year_site.split('_')[1]
+        if sites is not None and site not in sites:
+            continue
+
+        base_dir = os.path.join(main_path, year_site, 'netCDF')
+        dates = set()
+        for data_type, pattern in SUMMARY_PATTERNS.items():
+            for file in pread._glob(os.path.join(base_dir, pattern), catalog, data_type):
+                dates.add(os.path.basename(file).split('_')[0][-8:])
+
+        for date in sorted(dates):
+            days[(site, date)] = (base_dir, pcache.source_signature(base_dir, _day_patterns(date), catalog))
+    return days
+
+
+
+def _day_patterns(date):
+    """
+    SUMMARY_PATTERNS restricted to the files of one date, whatever their instrument prefix.
+    """
+
+    return {data_type: pattern.replace('*', f'*{date}*') for data_type, pattern in SUMMARY_PATTERNS.items()}
+
+
+
+def _summarize_day(task, catalog=None):
+    """
+    Computes one row of the summary table from the daily rate and PSD files of a site-day.
+    """
+
+    site, date, base_dir, signature = task
+    row = dict.fromkeys(SUMMARY_COLUMNS, np.nan)
+    row.update({'site': site, 'date': date, 'signature': signature, 'count': 0})
+
+    # the date is matched after any instrument prefix, so every file of the day is merged
+    ds = pread._load_day(base_dir, '*' + date, SUMMARY_PATTERNS, catalog=catalog)
+
+    if 'rr_adj' in ds or 'nrr_adj' in ds:
+        for column, variable in [('rain_total', 'rr_adj'), ('snow_total', 'nrr_adj')]:
+            if variable in ds:
+                row[column] = float(np.nansum(ds[variable].values)) / 60
+        if 'ed_adj' in ds:
+            # same precipitating-minute test as the catalog's availability index
+            rate = sum(np.nan_to_num(ds[name].values) for name in ['rr_adj', 'nrr_adj'] if name in ds)
+            ed_adj = ds['ed_adj'].values[np.asarray(rate) > 0]
+            ed_adj = ed_adj[~np.isnan(ed_adj)]
+            row['ed_adj_mean'] = float(ed_adj.mean()) if ed_adj.size > 0 else np.nan
+
+    if 'particle_size_distributions_psd' in ds:
+        try:
+            params = pcalc.get_psd_params(ds)
+            row.update({'N0': float(params['N0']), 'lambda': float(params['lambda']), 'count': params['count']})
+        except (RuntimeError, TypeError, ValueError):
+            row.update({'N0': 0.0, 'lambda': 0.0, 'count': int(np.nansum(ds['particle_size_distributions_psd'].values))})
+
+    return row
+
+
+
+def main(argv=None):
+    """
+    Entry point of the pipdb console command.
+    """
+
+    parser = argparse.ArgumentParser(prog='pipdb', description='Precipitation Imaging Package (PIP) data tools.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    summarize = commands.add_parser('summarize', help='Update the per site-day summary table (only new or changed days are processed).')
+    summarize.add_argument('--main-path', default=None, help='Directory holding the YEAR_SITE folders (default: pconfig.MAIN_PATH).')
+    summarize.add_argument('--output', default=None, help='Summary table path (default: pipdb_daily_summaries.nc in the local pipdb cache).')
+    summarize.add_argument('--sites', nargs='+', default=None, help='Sites to include (default: all).')
+    summarize.add_argument('--jobs', type=int, default=None, help='Number of worker processes (default: one per CPU).')
+    summarize.add_argument('--catalog', nargs='?', const='', default=None,
+                           help='Use the pcatalog file index, optionally at the given SQLite path.')
+    summarize.add_argument('--full', action='store_true', help='Recompute every day.')
+
+    index = commands.add_parser('index', help='Update the file catalog and its per-day availability index.')
+    index.add_argument('--main-path', default=None, help='Directory holding the YEAR_SITE folders (default: pconfig.MAIN_PATH).')
+    index.add_argument('--catalog', default=None, help='SQLite path of the catalog (default: pipdb_catalog.sqlite in the local pipdb cache).')
+    index.add_argument('--sites', nargs='+', default=None, help='Sites to index (default: all).')
+    index.add_argument('--jobs', type=int, default=None, help='Number of worker processes (default: one per CPU).')
+    index.add_argument('--full', action='store_true', help='Re-read every file.')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'summarize':
+        catalog = None
+        if args.catalog is not None:
+            catalog = pcatalog.open_catalog(args.main_path, args.catalog or None)
+        update_daily_summaries(args.output, args.main_path, args.sites, args.jobs, catalog, args.full)
+
+    elif args.command == 'index':
+        catalog = pcatalog.open_catalog(args.main_path, args.catalog)
+        if args.full:
+            catalog.refresh(full=True)
+        indexed = catalog.update_availability(args.sites, args.jobs, args.full)
+        print(f'Indexed: {indexed} new or changed files -> {catalog.db_path}')
+
+
+
+if __name__ == '__main__':
+    main()
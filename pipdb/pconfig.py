@@ -6,8 +6,26 @@ __author__      = "Fraser King"
 __year__        = "2024"
 __institution__   = "University of Michigan"
 
+import hashlib
+import os
+
 ### Data Parse Variables
 MAIN_PATH = '/Users/fraserking/Development/pip_processing/data/converted/'
 
 ### SITES
-ALL_SITES = ['HUR', 'KO1', 'KO2', 'IMP', 'YFB', 'MQT', 'FIN', 'APX', 'HAK', 'KIS', 'NSA']
\ No newline at end of file
+ALL_SITES = ['HUR', 'KO1', 'KO2', 'IMP', 'YFB', 'MQT', 'FIN', 'APX', 'HAK', 'KIS', 'NSA']
+
+### Local cache
+# Catalogs, summary tables and derived products go here by default rather than next to the data, since MAIN_PATH
+# is often a network filesystem (unreliable SQLite locking) or a read-only mount.
+CACHE_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'pipdb')
+
+
+def archive_cache_dir(main_path):
+    """
+    Local cache directory of one data tree: a folder of CACHE_PATH named after main_path and a hash of its absolute path.
+    """
+
+    main_path = os.path.abspath(main_path)
+    digest = hashlib.sha1(main_path.encode()).hexdigest()[:12]
+    return os.path.join(CACHE_PATH, f'{os.path.basename(main_path) or "root"}_{digest}')
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+
+"""pevents.py: utility resource for segmenting the PIP minute series into precipitation events and querying them."""
+
+__author__      = "Fraser King"
+__year__        = "2024"
+__institution__   = "University of Michigan"
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from . import pread
+from . import pcalc
+from . import pcache
+
+EVENT_VARIABLES = ['ed_adj', 'rr_adj', 'nrr_adj', 'psd']
+
+EVENT_COLUMNS = {
+    'site': 'Site name',
+    'start': 'First precipitating minute of the event',
+    'end': 'Last precipitating minute of the event',
+    'phase': 'snow if the mean ed_adj of the event is <= threshold, rain if above, unknown without valid ed_adj',
+    'duration': 'Minutes from start to end (inclusive)',
+    'lwe_total': 'Accumulated rr_adj + nrr_adj (mm, from one-minute mm hr-1 rates)',
+    'peak_rate': 'Maximum rr_adj + nrr_adj (mm hr-1)',
+    'ed_adj_mean': 'Mean ed_adj over the precipitating minutes (g cm-3)',
+    'N0': 'Exponential PSD intercept from get_psd_params over the event (0 if the fit failed, NaN without psd_params)',
+    'lambda': 'Exponential PSD slope from get_psd_params over the event (0 if the fit failed, NaN without psd_params)',
+}
+
+
+def find_events(ds, site=None, gap=10, min_duration=30, min_rate=0.0, threshold=0.4, psd_params=True):
+    """
+    Segments a minute series into precipitation events with a vectorized run-length encoding.
+
+    A minute is precipitating when rr_adj + nrr_adj > min_rate. Precipitating minutes separated by at most gap
+    minutes (dry or missing) belong to the same event, so a missing day always ends an event.
+
+    Parameters:
+    - ds: xarray.Dataset with ed_adj, rr_adj and nrr_adj (and particle_size_distributions_psd for psd_params).
+    - site: Optional site name stored in the table.
+    - gap: Longest run of dry or missing minutes tolerated inside an event.
+    - min_duration: Shortest event kept, in minutes.
+    - min_rate: Rate (mm hr-1) a minute must exceed to count as precipitating.
+    - threshold: ed_adj value separating snow from rain events (see split_dataset_by_ed_adj).
+    - psd_params: If True, fit N0 and lambda over each event with get_psd_params.
+
+    Returns:
+    - A pandas.DataFrame with one row per event (see EVENT_COLUMNS).
+    """
+
+    starts, ends = _segment(ds, gap, min_rate)
+    return _event_rows(ds, starts, ends, site, min_duration, min_rate, threshold, psd_params)
+
+
+
+def build_event_table(sites, output=None, main_path=None, gap=10, min_duration=30, min_rate=0.0, threshold=0.4,
+                      psd_params=True, catalog=None, prefetch=2, days=None):
+    """
+    Streams every day of the given sites, segments them into events and writes the persistent event table.
+
+    Days are read one at a time (see pread.iter_days); an event still open at the end of a day is carried over
+    and completed with the next day, so events crossing midnight are kept whole.
+
+    Parameters:
+    - sites: A site name or list of sites.
+    - output: Optional path of the event table (NetCDF). Rows of sites not listed here are kept.
+    - main_path: The main directory path where YEAR_SITE subfolders are located (default: the catalog's, else pconfig.MAIN_PATH).
+    - gap, min_duration, min_rate, threshold, psd_params: See find_events.
+    - catalog: Optional pcatalog.Catalog used for file lookups instead of the filesystem.
+    - prefetch: Number of days loaded ahead in the background.
+    - days: Optional day filter answered from the catalog's availability index (see pread.load_range). 'precip'
+            skips the dry days without changing the events found.
+
+    Returns:
+    - A pandas.DataFrame with the events of the given sites.
+    """
+
+    sites = [sites] if isinstance(sites, str) else list(sites)
+    variables = EVENT_VARIABLES if psd_params else EVENT_VARIABLES[:3]
+
+    tables = []
+    for site in sites:
+        carry = None
+        for _, _, day in pread.iter_days(site, variables=variables, main_path=main_path, catalog=catalog, prefetch=prefetch, days=days):
+            ds = day if carry is None else xr.concat([carry, day], dim='time')
+            starts, ends = _segment(ds, gap, min_rate)
+
+            # the last event may continue into the next day if it ends within gap minutes of the end of this one
+            carry = None
+            if starts.size > 0:
+                last_minute = ds.time.values[-1]
+                if ds.time.values[ends[-1]] + np.timedelta64(gap + 1, 'm') > last_minute:
+                    carry = ds.isel(time=slice(starts[-1], None))
+                    starts, ends = starts[:-1], ends[:-1]
+
+            tables.append(_event_rows(ds, starts, ends, site, min_duration, min_rate, threshold, psd_params))
+
+        if carry is not None:
+            starts, ends = _segment(carry, gap, min_rate)
+            tables.append(_event_rows(carry, starts, ends, site, min_duration, min_rate, threshold, psd_params))
+
+    events = pd.concat(tables, ignore_index=True) if tables else _event_rows(xr.Dataset(), [], [], None, 0, 0, 0, False)
+
+    if output is not None:
+        existing = pcache.read_table(output)
+        if existing is not None:
+            existing = existing[~existing['site'].isin(sites)]
+            table = pd.concat([existing, events], ignore_index=True) if len(events) > 0 else existing
+        else:
+            table = events
+        pcache.write_table(table.sort_values(['site', 'start'], ignore_index=True), output, EVENT_COLUMNS)
+
+    return events
+
+
+
+def query_events(table, site=None, phase=None, start=None, end=None, min_duration=None, min_peak_rate=None, min_lwe=None):
+    """
+    Selects events from the event table without touching the raw data.
+
+    Parameters:
+    - table: Path of an event table written by build_event_table, or its pandas.DataFrame.
+    - site: Optional site name or list of sites.
+    - phase: Optional phase ('snow', 'rain' or 'unknown').
+    - start: Optional date; only events ending on or after it are kept.
+    - end: Optional date; only events starting on or before it are kept.
+    - min_duration: Optional minimum duration in minutes.
+    - min_peak_rate: Optional minimum peak rate (mm hr-1).
+    - min_lwe: Optional minimum accumulated LWE (mm).
+
+    Returns:
+    - A pandas.DataFrame with the matching events.
+    """
+
+    events = pcache.read_table(table) if isinstance(table, str) else table
+    if events is None:
+        print(f'Error: No event table found at {table}')
+        return
+
+    keep = np.ones(len(events), dtype=bool)
+    if site is not None:
+        keep &= events['site'].isin([site] if isinstance(site, str) else site).values
+    if phase is not None:
+        keep &= (events['phase'] == phase).values
+    if start is not None:
+        keep &= (events['end'] >= pd.Timestamp(start)).values
+    if end is not None:
+        keep &= (events['start'] <= pd.Timestamp(end)).values
+    if min_duration is not None:
+        keep &= (events['duration'] >= min_duration).values
+    if min_peak_rate is not None:
+        keep &= (events['peak_rate'] >= min_peak_rate).values
+    if min_lwe is not None:
+        keep &= (events['lwe_total'] >= min_lwe).values
+    return events[keep].reset_index(drop=True)
+
+
+
+def load_event(event, variables=None, main_path=None, catalog=None, compact=None):
+    """
+    Loads the raw minute data of a single event (a row of the event table).
+
+    Parameters:
+    - event: Row of the event table (e.g., query_events(...).iloc[0]).
+    - variables: Optional list of variables to keep (see pread.load_range).
+    - main_path: The main directory path where YEAR_SITE subfolders are located (default: the catalog's, else pconfig.MAIN_PATH).
+    - catalog: Optional pcatalog.Catalog used for file lookups instead of the filesystem.
+    - compact: Optional compact layout for the 2D distributions (see pread.compact_distributions).
+
+    Returns:
+    - An xarray.Dataset covering the event's minutes.
+    """
+
+    start, end = pd.Timestamp(event['start']), pd.Timestamp(event['end'])
+    ds = pread.load_range(event['site'], start, end, variables=variables, main_path=main_path, catalog=catalog, compact=compact)
+    return ds.sel(time=slice(start, end))
+
+
+
+def _segment(ds, gap=10, min_rate=0.0):
+    """
+    Run-length encodes the precipitating minutes of ds.
+
+    Returns:
+    - (starts, ends) arrays of time positions of the first and last precipitating minute of each run.
+    """
+
+    if 'time' not in ds.dims or ds.sizes['time'] == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    rate = _total_rate(ds)
+    active = np.flatnonzero(rate > min_rate)
+    if active.size == 0:
+        return active, active
+
+    minutes = ds.time.values[active].astype('datetime64[m]').astype(np.int64)
+    breaks = np.flatnonzero(np.diff(minutes) > gap + 1)
+    starts = active[np.r_[0, breaks + 1]]
+    ends = active[np.r_[breaks, active.size - 1]]
+    return starts, ends
+
+
+
+def _total_rate(ds):
+    """
+    rr_adj + nrr_adj per minute (NaN treated as zero).
+    """
+
+    rate = np.zeros(ds.sizes['time'])
+    for variable in ['rr_adj', 'nrr_adj']:
+        rate += np.nan_to_num(ds[variable].values)
+    return rate
+
+
+
+def _event_rows(ds, starts, ends, site, min_duration, min_rate, threshold, psd_params):
+    """
+    Builds the event table rows for the runs (starts, ends) of ds, dropping runs shorter than min_duration.
+    """
+
+    starts, ends = np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+    if starts.size == 0:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in
+                             [('site', object), ('start', 'datetime64[ns]'), ('end', 'datetime64[ns]'), ('phase', object),
+                              ('duration', np.int64), ('lwe_total', float), ('peak_rate', float), ('ed_adj_mean', float),
+                              ('N0', float), ('lambda', float)]})
+
+    times = ds.time.values
+    duration = ((times[ends] - times[starts]) // np.timedelta64(1, 'm')).astype(np.int64) + 1
+    keep = duration >= min_duration
+    starts, ends, duration = starts[keep], ends[keep], duration[keep]
+    if starts.size == 0:
+        return _event_rows(ds, [], [], site, min_duration, min_rate, threshold, psd_params)
+
+    # per-event sums and maxima with reduceat over [start, end + 1) pairs
+    rate = _total_rate(ds)
+    ed_adj = ds['ed_adj'].values
+    counted = (rate > min_rate) & ~np.isnan(ed_adj)
+    pairs = np.ravel(np.column_stack([starts, ends + 1]))
+    reduce = lambda ufunc, values: ufunc.reduceat(np.append(values, 0), pairs)[::2]
+
+    lwe_total = reduce(np.add, rate) / 60
+    peak_rate = reduce(np.maximum, rate)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ed_adj_mean = reduce(np.add, np.where(counted, ed_adj, 0.0)) / reduce(np.add, counted.astype(np.int64))
+
+    N0 = np.full(starts.size, np.nan)
+    lam = np.full(starts.size, np.nan)
+    if psd_params:
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            try:
+                params = pcalc.get_psd_params(ds.isel(time=slice(start, end + 1)))
+                N0[i], lam[i] = params['N0'], params['lambda']
+            except (RuntimeError, TypeError, ValueError):
+                N0[i] = lam[i] = 0.0
+
+    return pd.DataFrame({
+        'site': [site] * starts.size,
+        'start': times[starts],
+        'end': times[ends],
+        'phase': np.where(np.isnan(ed_adj_mean), 'unknown', np.where(ed_adj_mean <= threshold, 'snow', 'rain')),
+        'duration': duration,
+        'lwe_total': lwe_total,
+        'peak_rate': peak_rate,
+        'ed_adj_mean': ed_adj_mean,
+        'N0': N0,
+        'lambda': lam,
+    })
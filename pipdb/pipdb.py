@@ -8,11 +8,9 @@ __institution__   = "University of Michigan"
 
 
 from . import pconfig
-from .pread import get_precip_data_for_day, load_single_year_data, load_data_for_sites
-from .pplot import (plot_precip_data_for_day, plot_inverse_exponential,
-                    plot_distribution_means_with_confidence_intervals,
-                    plot_site, plot_sites, compare_adjusted_values)
-from .pcalc import get_psd_params, split_dataset_by_ed_adj, describe_dataset
+# The lazy export table lives in the package __init__; this module re-exports it so pipdb.pipdb and pipdb
+# expose the same API.
+from . import _EXPORTS, _EXPORT_MODULES, __all__, __getattr__, __dir__
 
 # import pconfig
 # from pread import get_precip_data_for_day, load_single_year_data, load_data_for_sites
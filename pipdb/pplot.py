@@ -10,71 +10,154 @@ import matplotlib.pyplot as plt
 import matplotlib.path as mpath
 import matplotlib.patheffects as pe
 import numpy as np
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
+import os
+import xarray as xr
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+from . import pread
+from . import pcalc
+from . import pconfig
+from . import ppyramid
 
 
-def plot_precip_data_for_day(ds, site, year, month, day):
+QUICKLOOK_DISTRIBUTIONS = [
+    ('particle_size_distributions_psd', 'particle_size_distributions_bin_centers', 'PSD (m$^{−3}$ mm$^{−1}$)', '#000871',
+     dict(cmap='plasma', norm=LogNorm(vmin=0.1, vmax=10000))),
+    ('velocity_distributions_vvd', 'velocity_distributions_bin_centers', 'VVD (m s$^{-1}$)', '#0b0780',
+     dict(cmap='plasma', vmin=0, vmax=3)),
+    ('edensity_distributions_rho', 'edensity_distributions_bin_centers', 'Rho (g cm$^{-3}$)', 'white',
+     dict(cmap='seismic', vmin=0, vmax=1)),
+]
+
+_worker_quicklook = None
+_BASEMAPS = {}
+
+
+def plot_precip_data_for_day(ds, site, year, month, day, save_path='../images/precip_for_day.png', show=True):
     """
     Plots a 1x5 subplot for the given xarray.Dataset with the first three plots as 2D data using imshow.
     
     Parameters:
-    - ds: xarray.Dataset containing the precipitation data.
-    """
-    fig, axs = plt.subplots(5, 1, figsize=(12, 18), constrained_layout=True)
-    fig.suptitle(f'PIP Variable Quicklook for {site} on {year}-{month}-{day}')
-
-    axs[0].patch.set_facecolor('#000871')
-    h = axs[0].imshow(ds['particle_size_distributions_psd'].T, cmap='plasma', norm=LogNorm(vmin=0.1, vmax=10000), aspect='auto')
-    cbar = fig.colorbar(h, ax=axs[0])
-    cbar.set_label('PSD (m$^{−3}$ mm$^{−1}$)')
-    bin_centers = ds.particle_size_distributions_bin_centers.values
-    ticks_idx = np.linspace(0, len(bin_centers) - 50, 4, dtype=int)
-    axs[0].set_yticks(ticks_idx)
-    axs[0].set_yticklabels(bin_centers[ticks_idx])
-    axs[0].set_ylim((0, 81))
-    axs[0].invert_yaxis()
-    axs[0].set_xlabel('Minute of day')
-    axs[0].set_ylabel('Mean D (mm)')
-    axs[0].invert_yaxis()
-
-    axs[1].patch.set_facecolor('#0b0780')
-    h = axs[1].imshow(ds['velocity_distributions_vvd'].T, cmap='plasma', vmin=0, vmax=3, aspect='auto')
-    cbar = fig.colorbar(h, ax=axs[1])
-    cbar.set_label('VVD (m s$^{-1}$)')
-    bin_centers = ds.velocity_distributions_bin_centers.values
-    ticks_idx = np.linspace(0, len(bin_centers) - 50, 4, dtype=int)
-    axs[1].set_yticks(ticks_idx)
-    axs[1].set_yticklabels(bin_centers[ticks_idx])
-    axs[1].set_ylim((0, 81))
-    axs[1].invert_yaxis()
-    axs[1].set_xlabel('Minute of day')
-    axs[1].set_ylabel('Mean D (mm)')
-    axs[1].invert_yaxis()
-
-    axs[2].patch.set_facecolor('white')
-    h = axs[2].imshow(ds['edensity_distributions_rho'].T, cmap='seismic', vmin=0, vmax=1, aspect='auto')
-    cbar = fig.colorbar(h, ax=axs[2])
-    cbar.set_label('Rho (g cm$^{-3}$)')
-    bin_centers = ds.edensity_distributions_bin_centers.values
-    ticks_idx = np.linspace(0, len(bin_centers) - 50, 4, dtype=int)
-    axs[2].set_yticks(ticks_idx)
-    axs[2].set_yticklabels(bin_centers[ticks_idx])
-    axs[2].set_ylim((0, 81))
-    axs[2].invert_yaxis()
-    axs[2].set_xlabel('Minute of day')
-    axs[2].set_ylabel('Mean D (mm)')
-    axs[2].invert_yaxis()
-
-    axs[3].plot(np.arange(1440), ds['ed_adj'], linewidth=2, color='black', label='ed_adj')
+    - ds: xarray.Dataset containing the precipitation data (dense or compact layout).
+    - site, year, month, day: Details used in the title.
+    - save_path: Where to save the figure (None to skip saving).
+    - show: Whether to display the figure.
+    """
+    fig = plt.figure(figsize=(12, 18), constrained_layout=True)
+    quicklook = _create_quicklook(fig)
+    _update_quicklook(quicklook, ds, site, year, month, day)
+
+    if save_path is not None:
+        plt.savefig(save_path)
+    if show:
+        plt.show()
+
+
+def render_quicklooks(site_days, output_dir='../images/quicklooks', main_path=None, n_jobs=None, catalog=None, days=None,
+                      minutes=None):
+    """
+    Renders daily quicklooks (see plot_precip_data_for_day) for many site-days in a pool of headless workers.
+
+    Each worker builds one figure with the non-interactive Agg canvas and, for every day, only swaps in the
+    new image and line data before saving, rather than rebuilding the axes and colorbars.
+
+    Parameters:
+    - site_days: Iterable of (site, year, month, day) tuples.
+    - output_dir: Directory for the images, written as SITE_YYYYMMDD.png.
+    - main_path: The main directory path where YEAR_SITE subfolders are located (default: the catalog's, else pconfig.MAIN_PATH).
+    - n_jobs: Number of worker processes (default: one per CPU; 1 renders serially in this process).
+    - catalog: Optional pcatalog.Catalog used for file lookups instead of the filesystem.
+    - days: Optional day filter answered from the catalog's availability index (see pread.load_range); site-days
+            failing it are skipped without opening their files.
+    - minutes: Optional minute filter answered from the same index; the other minutes are drawn as missing.
+
+    Returns:
+    - List of written image paths, in the order of site_days (None where no data was found or the day was filtered out).
+    """
+
+    main_path = pread._resolve_main_path(main_path, catalog)
+    os.makedirs(output_dir, exist_ok=True)
+    site_days = list(site_days)
+
+    if days is not None or minutes is not None:
+        if catalog is None:
+            raise ValueError('The days and minutes filters need a catalog with an availability index (see pcatalog.open_catalog)')
+        sites = sorted({site for site, _, _, _ in site_days})
+        catalog.update_availability(sites)
+        if days is not None:
+            allowed = {site: set(catalog.available_dates(site, days)) for site in sites}
+            site_days = [site_day if f'{int(site_day[1])}{int(site_day[2]):02d}{int(site_day[3]):02d}' in allowed[site_day[0]]
+                         else None for site_day in site_days]
+
+    render_day = partial(_render_quicklook_task, output_dir=output_dir, main_path=main_path, catalog=catalog, minutes=minutes)
+    todo = [site_day for site_day in site_days if site_day is not None]
+    if n_jobs == 1 or len(todo) <= 1:
+        paths = iter([render_day(site_day) for site_day in todo])
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as workers:
+            paths = iter(list(workers.map(render_day, todo)))
+    return [next(paths) if site_day is not None else None for site_day in site_days]
+
+
+def _render_quicklook_task(site_day, output_dir, main_path, catalog=None, minutes=None):
+    """
+    Loads and renders one site-day on this process's reusable quicklook figure.
+    """
+
+    global _worker_quicklook
+
+    site, year, month, day = site_day
+    base_dir = os.path.join(main_path, f'{year}_{site}', 'netCDF')
+    ds = pread.get_precip_data_for_day(base_dir, site, year, month, day, catalog=catalog)
+    if ds is None:
+        return None
+    if minutes is not None:
+        mask = pread._minute_mask(base_dir, f'*{int(year)}{int(month):02d}{int(day):02d}', pread.FILE_PATTERNS, catalog, minutes)
+        if mask is not None:
+            ds = ds.where(xr.DataArray(mask[(ds.time.dt.hour * 60 + ds.time.dt.minute).values], dims='time'))
+
+    if _worker_quicklook is None:
+        fig = Figure(figsize=(12, 18), constrained_layout=True)
+        FigureCanvasAgg(fig)
+        _worker_quicklook = _create_quicklook(fig)
+
+    _update_quicklook(_worker_quicklook, ds, site, year, month, day)
+    path = os.path.join(output_dir, f'{site}_{int(year)}{int(month):02d}{int(day):02d}.png')
+    _worker_quicklook['fig'].savefig(path)
+    return path
+
+
+def _create_quicklook(fig):
+    """
+    Builds the 5-panel quicklook axes, images, colorbars and lines on fig with empty data.
+    """
+
+    axs = fig.subplots(5, 1)
+    empty_2d = np.full((131, 1440), np.nan)
+    empty_1d = np.full(1440, np.nan)
+
+    images = []
+    for ax, (variable, bins, units, facecolor, style) in zip(axs, QUICKLOOK_DISTRIBUTIONS):
+        ax.patch.set_facecolor(facecolor)
+        h = ax.imshow(empty_2d, aspect='auto', **style)
+        cbar = fig.colorbar(h, ax=ax)
+        cbar.set_label(units)
+        ax.set_xlabel('Minute of day')
+        ax.set_ylabel('Mean D (mm)')
+        images.append(h)
+
+    lines = {}
+    lines['ed_adj'], = axs[3].plot(np.arange(1440), empty_1d, linewidth=2, color='black', label='ed_adj')
     axs[3].set_xlabel('Minute of day')
     axs[3].set_ylabel('Adjusted eDensity (g cm$^{-3}$)')
     axs[3].grid(True)
     axs[3].set_xlim((0, 1440))
     
-    axs[4].plot(np.arange(1440), ds['nrr_adj'], linewidth=2, label='Snow', color='r')
-    axs[4].plot(np.arange(1440), ds['rr_adj'], linewidth=2, label='Rain', color='b')
+    lines['nrr_adj'], = axs[4].plot(np.arange(1440), empty_1d, linewidth=2, label='Snow', color='r')
+    lines['rr_adj'], = axs[4].plot(np.arange(1440), empty_1d, linewidth=2, label='Rain', color='b')
     axs[4].set_title('nrr_adj and rr_adj over Time')
     axs[4].set_xlabel('Minute of day')
     axs[4].set_ylabel('LWE Precipitation Rate (mm hr$^{-1}$)')
@@ -82,8 +165,124 @@ def plot_precip_data_for_day(ds, site, year, month, day):
     axs[4].legend()
     axs[4].grid(True)
 
-    plt.savefig('../images/precip_for_day.png')
-    plt.show()
+    return {'fig': fig, 'axs': axs, 'images': images, 'lines': lines}
+
+
+def _update_quicklook(quicklook, ds, site, year, month, day):
+    """
+    Swaps a day's data into a quicklook built by _create_quicklook.
+    """
+
+    ds = pread.expand_distributions(ds)
+    quicklook['fig'].suptitle(f'PIP Variable Quicklook for {site} on {year}-{month}-{day}')
+
+    for ax, h, (variable, bins, units, facecolor, style) in zip(quicklook['axs'], quicklook['images'], QUICKLOOK_DISTRIBUTIONS):
+        values = ds[variable].values.T
+        h.set_data(values)
+        h.set_extent((-0.5, values.shape[1] - 0.5, values.shape[0] - 0.5, -0.5))
+        bin_centers = ds[bins].values
+        ticks_idx = np.linspace(0, len(bin_centers) - 50, 4, dtype=int)
+        ax.set_yticks(ticks_idx)
+        ax.set_yticklabels(bin_centers[ticks_idx])
+        ax.set_xlim((-0.5, values.shape[1] - 0.5))
+        ax.set_ylim((0, 81))
+
+    for variable, line in quicklook['lines'].items():
+        line.set_data(np.arange(ds.sizes['time']), ds[variable].values)
+    for ax in quicklook['axs'][3:]:
+        ax.relim()
+        ax.autoscale_view(scalex=False)
+
+
+def plot_pyramid(pyramid, start=None, end=None, statistic='mean', site='', width=12, dpi=100,
+                 save_path='../images/precip_span.png', show=True):
+    """
+    Plots the quicklook panels (see plot_precip_data_for_day) over any span, from the pyramid level whose bucket size
+    best matches the span and the figure width, so a season draws about one column per pixel.
+
+    Parameters:
+    - pyramid: Pyramid (see ppyramid.build_pyramid), the path of a saved pyramid, or an xarray.Dataset to reduce first.
+    - start, end: Optional bounds of the span (default: the whole pyramid).
+    - statistic: Per-bucket statistic to draw, one of 'mean', 'max' or 'count'.
+    - site: Site name used in the title (default: the site stored in the pyramid, if any).
+    - width: Figure width in inches.
+    - dpi: Figure resolution; width * dpi is the largest number of columns drawn.
+    - save_path: Where to save the figure (None to skip saving).
+    - show: Whether to display the figure.
+
+    Returns:
+    - The name of the pyramid level that was drawn.
+    """
+
+    import matplotlib.dates as mdates # imported here as only the long-span plots need it
+
+    if statistic not in ['mean', 'max', 'count']:
+        raise ValueError(f"statistic must be 'mean', 'max' or 'count', not {statistic!r}")
+    if isinstance(pyramid, str):
+        pyramid = ppyramid.open_pyramid(pyramid)
+    elif isinstance(pyramid, xr.Dataset):
+        pyramid = ppyramid.build_pyramid(pyramid)
+
+    site = site or next(iter(pyramid.values())).attrs.get('site', '')
+    coarsest = max(pyramid.values(), key=lambda level_ds: level_ds.attrs['minutes']).time.values
+    start = np.datetime64(start if start is not None else coarsest[0], 'm')
+    end = np.datetime64(end if end is not None else coarsest[-1] + np.timedelta64(1439, 'm'), 'm')
+    if start > end:
+        print('Error: start must not be after end')
+        return
+
+    level = ppyramid.select_level(pyramid, start, end, width * dpi)
+    step = np.timedelta64(pyramid[level].attrs['minutes'], 'm')
+    grid = np.arange(start - (start - np.datetime64(start, 'D')) % step, end + np.timedelta64(1, 'm'), step)
+    data = pyramid[level].sel(time=slice(grid[0], grid[-1])).load().reindex(time=grid.astype('datetime64[ns]'))
+    extent_x = mdates.date2num(grid[0]), mdates.date2num(grid[-1] + step)
+
+    fig = plt.figure(figsize=(width, 18), dpi=dpi, constrained_layout=True)
+    axs = fig.subplots(5, 1)
+    fig.suptitle(f'PIP Variable {statistic.capitalize()} for {site} from {start.astype("datetime64[D]")} to {end.astype("datetime64[D]")} ({level})')
+
+    for ax, (variable, bins, units, facecolor, style) in zip(axs, QUICKLOOK_DISTRIBUTIONS):
+        name = f'{variable}_{statistic}'
+        if name not in data:
+            continue
+        ax.patch.set_facecolor(facecolor)
+        values = data[name].values.T
+        h = ax.imshow(values, aspect='auto', interpolation='nearest', extent=(*extent_x, values.shape[0] - 0.5, -0.5),
+                      **(style if statistic != 'count' else dict(cmap='viridis')))
+        cbar = fig.colorbar(h, ax=ax)
+        cbar.set_label(units if statistic != 'count' else 'Valid minutes')
+        bin_centers = data[bins].values
+        ticks_idx = np.linspace(0, len(bin_centers) - 50, 4, dtype=int)
+        ax.set_yticks(ticks_idx)
+        ax.set_yticklabels(bin_centers[ticks_idx])
+        ax.set_ylim((0, 81))
+        ax.set_ylabel('Mean D (mm)')
+
+    times = mdates.date2num(grid)
+    if f'ed_adj_{statistic}' in data:
+        axs[3].plot(times, data[f'ed_adj_{statistic}'], linewidth=2, color='black', label='ed_adj')
+    axs[3].set_ylabel('Adjusted eDensity (g cm$^{-3}$)')
+    axs[3].grid(True)
+
+    for variable, label, color in [('nrr_adj', 'Snow', 'r'), ('rr_adj', 'Rain', 'b')]:
+        if f'{variable}_{statistic}' in data:
+            axs[4].plot(times, data[f'{variable}_{statistic}'], linewidth=2, label=label, color=color)
+    axs[4].set_title('nrr_adj and rr_adj over Time')
+    axs[4].set_ylabel('LWE Precipitation Rate (mm hr$^{-1}$)')
+    axs[4].legend()
+    axs[4].grid(True)
+
+    locator = mdates.AutoDateLocator(minticks=3, maxticks=8)
+    for ax in axs:
+        ax.set_xlim(extent_x)
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+
+    if save_path is not None:
+        plt.savefig(save_path)
+    if show:
+        plt.show()
+    return level
 
 
 def plot_inverse_exponential(a, b):
@@ -110,22 +309,37 @@ def plot_inverse_exponential(a, b):
     plt.show()
 
 
-def plot_distribution_means_with_confidence_intervals(ds):
+def plot_distribution_means_with_confidence_intervals(ds, groups=None):
+    """
+    Plots the per-bin means and 95% confidence intervals of the rho, PSD and VVD distributions.
+
+    Parameters:
+    - ds: xarray.Dataset containing the PIP data, or a precomputed aggregate (see pcalc.aggregate_distributions),
+          in which case one line is drawn per group (e.g., per site, month or phase).
+    - groups: Optional list of group labels of the aggregate to plot (default: all groups).
+    """
+
     variables = [
         ('edensity_distributions_rho', 'edensity_distributions_bin_centers', 'Rho (g cm$^{-3}$)', 'Rho'),
         ('particle_size_distributions_psd', 'particle_size_distributions_bin_centers', 'PSD (m$^{−3}$ mm$^{−1}$)', 'PSD'),
         ('velocity_distributions_vvd', 'velocity_distributions_bin_centers', 'VVD (m s$^{-1}$)', 'VVD')
     ]
+
+    aggregate = ds if 'n_times' in ds else pcalc.aggregate_distributions(ds)
+    if groups is not None:
+        aggregate = aggregate.sel(group=groups)
+    single = aggregate.sizes['group'] == 1
+    colors = plt.cm.tab10(np.arange(aggregate.sizes['group']) % 10)
     
     fig, axs = plt.subplots(1, 3, figsize=(18, 6))
     
     for i, (variable_name, bins, units, title) in enumerate(variables):
-        means = ds[variable_name].mean(dim='time')
-        ci_lower = means - 1.96 * ds[variable_name].std(dim='time') / np.sqrt(len(ds['time']))
-        ci_upper = means + 1.96 * ds[variable_name].std(dim='time') / np.sqrt(len(ds['time']))
-        
-        axs[i].plot(ds[bins], means, label='Mean', linewidth=2, color='black')
-        axs[i].fill_between(ds[bins], ci_lower, ci_upper, color='black', alpha=0.2, label='95% CI')
+        statistics = pcalc.aggregate_statistics(aggregate, variable_name)
+        for j, group in enumerate(aggregate['group'].values):
+            color = 'black' if single else colors[j]
+            axs[i].plot(aggregate[bins], statistics['mean'][j], label='Mean' if single else group, linewidth=2, color=color)
+            axs[i].fill_between(aggregate[bins], statistics['ci_lower'][j], statistics['ci_upper'][j], color=color, alpha=0.2,
+                                label='95% CI' if single else None)
         axs[i].set_title(f'{title} Means')
         axs[i].set_xlabel('Bin Centers')
         axs[i].set_ylabel(units)
@@ -137,6 +351,7 @@ def plot_distribution_means_with_confidence_intervals(ds):
     plt.show()
 
 def polarCentral_set_latlim(lat_lims, ax):
+    import cartopy.crs as ccrs # imported here so the non-map plots do not load cartopy
     ax.set_extent([-180, 180, lat_lims[0], lat_lims[1]], ccrs.PlateCarree())
     theta = np.linspace(0, 2*np.pi, 100)
     center, radius = [0.5, 0.5], 0.5
@@ -144,27 +359,90 @@ def polarCentral_set_latlim(lat_lims, ax):
     circle = mpath.Path(verts * radius + center)
     ax.set_boundary(circle, transform=ax.transAxes)
 
-def plot_site(site, ds):
-    plt.figure(figsize=(12, 12))
-    ax = plt.axes(projection=ccrs.NorthPolarStereo())
-    polarCentral_set_latlim([30, 90], ax)
+def get_polar_basemap(lat_lims=(30, 90), resolution='50m', size=1500, cache_dir=None):
+    """
+    Renders the North Polar Stereo background used by plot_site and plot_sites once and caches it as a raster.
+
+    The stock image, land, coastlines and gridlines are drawn a single time per extent, coastline resolution
+    and raster size, kept in memory and optionally written to cache_dir as a PNG for reuse across sessions.
+
+    Parameters:
+    - lat_lims: Latitude limits of the map.
+    - resolution: Natural Earth coastline resolution (e.g., '110m', '50m', '10m').
+    - size: Width and height of the raster in pixels.
+    - cache_dir: Optional directory where rendered rasters are stored.
+
+    Returns:
+    - Tuple of (RGBA image array, extent in North Polar Stereo coordinates).
+    """
+
+    import cartopy.crs as ccrs
+    import cartopy.feature as cfeature
+
+    key = (tuple(lat_lims), resolution, int(size))
+    if key in _BASEMAPS:
+        return _BASEMAPS[key]
+
+    projection = ccrs.NorthPolarStereo()
+    fig = Figure(figsize=(1, 1))
+    ax = fig.add_axes([0, 0, 1, 1], projection=projection)
+    ax.set_extent([-180, 180, lat_lims[0], lat_lims[1]], ccrs.PlateCarree())
+    extent = ax.get_extent(crs=projection)
+
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = os.path.join(cache_dir, f'basemap_{lat_lims[0]}_{lat_lims[1]}_{resolution}_{int(size)}.png')
+        if os.path.exists(cache_file):
+            _BASEMAPS[key] = (plt.imread(cache_file), extent)
+            return _BASEMAPS[key]
+
+    # match the line widths of the 12x12 inch figures drawn by plot_site and plot_sites
+    inches = 12 * (plt.rcParams['figure.subplot.right'] - plt.rcParams['figure.subplot.left'])
+    fig.set_size_inches(inches, inches)
+    fig.set_dpi(size / inches)
+    FigureCanvasAgg(fig)
+
     ax.stock_img()
-    ax.coastlines(resolution='50m', color='black', zorder=1001)
-    ax.gridlines(linewidth=3, color='gray', linestyle=':', alpha=0.5, zorder=1005) 
+    ax.coastlines(resolution=resolution, color='black', zorder=1001)
+    ax.gridlines(linewidth=3, color='gray', linestyle=':', alpha=0.5, zorder=1005)
     ax.add_feature(cfeature.LAND)
+    ax.set_axis_off()
+    fig.canvas.draw()
+    raster = np.asarray(fig.canvas.buffer_rgba()).copy()
+
+    if cache_file is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        plt.imsave(cache_file, raster)
+
+    _BASEMAPS[key] = (raster, extent)
+    return _BASEMAPS[key]
+
+def _draw_polar_basemap(ax, lat_lims=(30, 90), resolution='50m', cache_dir=None):
+    """
+    Draws the cached polar background (see get_polar_basemap) as a raster underlay on a NorthPolarStereo axis.
+    """
+
+    import cartopy.crs as ccrs
+
+    raster, extent = get_polar_basemap(lat_lims, resolution, cache_dir=cache_dir)
+    polarCentral_set_latlim(lat_lims, ax)
+    ax.imshow(raster, extent=extent, transform=ccrs.NorthPolarStereo(), origin='upper', interpolation='antialiased', zorder=0)
+
+def plot_site(site, ds, cache_dir=None):
+    import cartopy.crs as ccrs
+    plt.figure(figsize=(12, 12))
+    ax = plt.axes(projection=ccrs.NorthPolarStereo())
+    _draw_polar_basemap(ax, [30, 90], '50m', cache_dir)
     plt.title('Site location - ' + site + f': ({ds.lat.values}, {ds.lon.values})')
     plt.scatter(ds.lon.values, ds.lat.values, color='black', marker='o', edgecolors='white', linewidth=4, s=500, transform=ccrs.Geodetic(), zorder=1006)  
     plt.savefig('../images/site_location.png')
     plt.show()
 
-def plot_sites(sites):
+def plot_sites(sites, cache_dir=None):
+    import cartopy.crs as ccrs
     plt.figure(figsize=(12, 12))
     ax = plt.axes(projection=ccrs.NorthPolarStereo())
-    polarCentral_set_latlim([30, 90], ax)
-    ax.stock_img()
-    ax.coastlines(resolution='50m', color='black', zorder=1001)
-    ax.gridlines(linewidth=3, color='gray', linestyle=':', alpha=0.5, zorder=1005) 
-    ax.add_feature(cfeature.LAND)
+    _draw_polar_basemap(ax, [30, 90], '50m', cache_dir)
     plt.title('Multi-Site Location Plot')
 
     for k, v in sites.items():
@@ -174,15 +452,35 @@ def plot_sites(sites):
     plt.savefig('../images/multi_site_locations.png')
     plt.show()
 
-def compare_adjusted_values(ds):
+def compare_adjusted_values(ds, mode='scatter', bins=200, limits=None):
+    """
+    Compares original and adjusted values for effective density and precipitation rates to quickly highlight
+    problems with the timing offset.
+
+    Parameters:
+    - ds: xarray.Dataset containing the PIP data, or comparison grids (see pcalc.comparison_histograms), which are
+          always drawn in density mode.
+    - mode: 'scatter' draws every minute; 'density' bins the pairs into 2D histograms and draws one image per panel,
+            which stays fast for multi-year datasets.
+    - bins, limits: Histogram bins and axis limits for the density mode (see pcalc.comparison_histograms).
+    """
+
+    if mode not in ['scatter', 'density']:
+        raise ValueError(f"mode must be 'scatter' or 'density', not {mode!r}")
+    if 'ed_adj_counts' in ds or mode == 'density':
+        _compare_adjusted_density(ds if 'ed_adj_counts' in ds else pcalc.comparison_histograms(ds, bins, limits))
+        return
+
     comparisons = [
         (None, None, None, None, None, None),
         ('edensity_lwe_rate_rr', 'rr_adj', 'black', 'Rainfall Rates', 'Original (m s$^{-1}$)', 'Adjusted (m s$^{-1}$)'),
         ('edensity_lwe_rate_nrr', 'nrr_adj', 'black', 'Snowfall Rates', 'Original (m s$^{-1}$)', 'Adjusted (m s$^{-1}$)')
     ]
 
-    rho_vals = np.where(ds['edensity_distributions_rho'] == 0, np.nan, ds['edensity_distributions_rho'])
-    rho_means = np.nanmean(rho_vals, axis=1)
+    rho_means = []
+    for block in pread.distribution_blocks(ds, 'edensity_distributions_rho'):
+        rho_means.append(np.nanmean(np.where(block == 0, np.nan, block), axis=1))
+    rho_means = np.concatenate(rho_means) if rho_means else np.empty(0)
     
     fig, axes = plt.subplots(nrows=1, ncols=3, figsize=(15, 5))
     
@@ -200,16 +498,52 @@ def compare_adjusted_values(ds):
             ax.legend()
             ax.plot([0, 0.4], [0, 0.4], linestyle='--', linewidth=2, color='black')
         else:
+            limit = float(np.nanmax(ds[var1].values))
             ax.scatter(ds[var1], ds[var2], color=var3, alpha=0.5)
             ax.set_title(f'{var1} vs. {var2}')
             ax.set_xlabel(var5)
             ax.set_ylabel(var6)
-            ax.set_xlim(0, np.nanmax(ds[var1]))
-            ax.set_ylim(0, np.nanmax(ds[var1]))
+            ax.set_xlim(0, limit)
+            ax.set_ylim(0, limit)
             ax.set_title(var4)
-            ax.plot([0, np.max(ds[var1])], [0, np.max(ds[var1])], linestyle='--', linewidth=2, color='black')
+            ax.plot([0, limit], [0, limit], linestyle='--', linewidth=2, color='black')
         count += 1
     
+    plt.tight_layout()
+    plt.savefig('../images/adjusted_values_comparisons.png')
+    plt.show()
+
+
+def _compare_adjusted_density(grids):
+    """
+    Density-mode body of compare_adjusted_values: one 2D histogram image per comparison pair.
+    """
+
+    panels = [
+        ('ed', 'Original Effective Density', 'L4 Effective Density (g cm$^{-3}$)', 'Rho (g cm$^{-3}$)'),
+        ('ed_adj', 'Adjusted Effective Density', 'Adjusted Effective Density (g cm$^{-3}$)', 'Rho (g cm$^{-3}$)'),
+        ('rr', 'Rainfall Rates', 'Original (m s$^{-1}$)', 'Adjusted (m s$^{-1}$)'),
+        ('nrr', 'Snowfall Rates', 'Original (m s$^{-1}$)', 'Adjusted (m s$^{-1}$)'),
+    ]
+    panels = [panel for panel in panels if f'{panel[0]}_counts' in grids]
+
+    fig, axes = plt.subplots(nrows=1, ncols=len(panels), figsize=(5 * len(panels), 5), squeeze=False)
+    for ax, (pair, title, xlabel, ylabel) in zip(axes[0], panels):
+        counts = grids[f'{pair}_counts'].values
+        x_edges, y_edges = grids[f'{pair}_x_edges'].values, grids[f'{pair}_y_edges'].values
+        statistics = pcalc.comparison_statistics(grids, pair)
+
+        h = ax.imshow(np.where(counts > 0, counts, np.nan).T, origin='lower', aspect='auto', interpolation='nearest',
+                      extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]), cmap='viridis',
+                      norm=LogNorm(vmin=1, vmax=max(counts.max(), 1)))
+        fig.colorbar(h, ax=ax, label='Minutes')
+        low, high = max(x_edges[0], y_edges[0]), min(x_edges[-1], y_edges[-1])
+        ax.plot([low, high], [low, high], linestyle='--', linewidth=2, color='black')
+        ax.set_title(f"{title}\nn={statistics['n']}, bias={statistics['bias']:.3g}, r={statistics['r']:.2f}")
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        ax.grid()
+
     plt.tight_layout()
     plt.savefig('../images/adjusted_values_comparisons.png')
     plt.show()
\ No newline at end of file
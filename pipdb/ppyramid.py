@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+"""ppyramid.py: utility resource for building multi-resolution (1-minute to daily) reductions of the PIP time series."""
+
+__author__      = "Fraser King"
+__year__        = "2024"
+__institution__   = "University of Michigan"
+
+import numpy as np
+import xarray as xr
+from . import pread
+
+PYRAMID_LEVELS = {'1min': 1, '10min': 10, 'hourly': 60, 'daily': 1440} # bucket size in minutes, each a multiple of the previous
+
+PYRAMID_VARIABLES = ['particle_size_distributions_psd', 'velocity_distributions_vvd', 'edensity_distributions_rho',
+                     'ed_adj', 'rr_adj', 'nrr_adj']
+
+
+def build_pyramid(ds, levels=None, chunk_size=10080):
+    """
+    Reduces the 2D distributions and rate series of a dataset to mean, max and count per bin over time buckets
+    of increasing size (see PYRAMID_LEVELS).
+
+    The finest level is computed from the data one time chunk at a time and each coarser level from the level below,
+    so plotting a month or season only touches a few hundred columns per variable.
+
+    Parameters:
+    - ds: xarray.Dataset containing the PIP data (dense or compact layout).
+    - levels: Optional list of level names to build (default: all of PYRAMID_LEVELS).
+    - chunk_size: Number of time steps read at once.
+
+    Returns:
+    - Dictionary of xarray.Datasets keyed by level name, each with <variable>_mean, <variable>_max and
+      <variable>_count on a 'time' axis of bucket start times.
+    """
+
+    levels = list(PYRAMID_LEVELS) if levels is None else [level for level in PYRAMID_LEVELS if level in levels]
+    minutes = ds.time.values.astype('datetime64[m]').astype(np.int64)
+
+    reduced = {level: {} for level in levels}
+    for name in PYRAMID_VARIABLES:
+        if name not in ds:
+            continue
+
+        # finest level from the raw minutes, then every coarser level from the one below
+        partials, start = [], 0
+        blocks = pread.distribution_blocks(ds, name, chunk_size) if name in pread.COMPACT_VARIABLES else [ds[name].values]
+        for block in blocks:
+            block_minutes = minutes[start:start + block.shape[0]]
+            start += block.shape[0]
+            valid = ~np.isnan(block)
+            partials.append(_reduce(block_minutes, PYRAMID_LEVELS[levels[0]], np.where(valid, block, 0), block, valid.astype(np.uint16)))
+
+        if not partials:
+            continue
+        stats = partials[0]
+        if len(partials) > 1:
+            # a bucket may straddle two chunks, so the chunk results are combined once more
+            parts = [np.concatenate(part) for part in zip(*partials)]
+            stats = _reduce(parts[0], PYRAMID_LEVELS[levels[0]], *parts[1:])
+        for i, level in enumerate(levels):
+            if i > 0:
+                stats = _reduce(stats[0], PYRAMID_LEVELS[level], *stats[1:])
+            reduced[level][name] = stats
+
+    pyramid = {}
+    for level in levels:
+        bucket_minutes = next(iter(reduced[level].values()))[0] if reduced[level] else np.empty(0, dtype=np.int64)
+        level_ds = xr.Dataset(coords={'time': bucket_minutes.astype('datetime64[m]').astype('datetime64[ns]')})
+        for name, (_, total, peak, count) in reduced[level].items():
+            dims = ('time',) + ((ds[name].dims[-1],) if name in pread.COMPACT_VARIABLES else ())
+            if len(dims) > 1:
+                level_ds = level_ds.assign_coords({dims[1]: ds[dims[1]].values})
+            with np.errstate(divide='ignore', invalid='ignore'):
+                level_ds[name + '_mean'] = (dims, (total / count).astype(np.float32))
+            level_ds[name + '_max'] = (dims, peak.astype(np.float32))
+            level_ds[name + '_count'] = (dims, count)
+        level_ds.attrs['minutes'] = PYRAMID_LEVELS[level]
+        pyramid[level] = level_ds
+    return pyramid
+
+
+
+def build_site_pyramid(site_name, start=None, end=None, output=None, levels=None, main_path=None, catalog=None, prefetch=2,
+                       days=None, minutes=None):
+    """
+    Streams the days of a site (see pread.iter_days) into a pyramid, one day at a time, and optionally saves it.
+
+    Parameters:
+    - site_name: Site name.
+    - start, end: Optional first and last dates (default: every available day).
+    - output: Optional NetCDF path the pyramid is written to (see write_pyramid).
+    - levels: Optional list of level names to build (default: all of PYRAMID_LEVELS). Leaving out '1min' keeps
+              the pyramid of a long archive small.
+    - main_path: The main directory path where YEAR_SITE subfolders are located (default: the catalog's, else pconfig.MAIN_PATH).
+    - catalog: Optional pcatalog.Catalog used for file lookups instead of the filesystem.
+    - prefetch: Number of days loaded ahead in the background.
+    - days, minutes: Optional day and minute filters answered from the catalog's availability index (see pread.load_range).
+
+    Returns:
+    - Dictionary of xarray.Datasets keyed by level name (see build_pyramid).
+    """
+
+    # every level divides a day, so the buckets of different days never overlap
+    reduced = {}
+    for _, _, day in pread.iter_days(site_name, start, end, prefetch=prefetch, variables=PYRAMID_VARIABLES,
+                                     main_path=main_path, catalog=catalog, days=days, minutes=minutes):
+        for level, level_ds in build_pyramid(day, levels).items():
+            reduced.setdefault(level, []).append(level_ds)
+
+    if not reduced:
+        print(f'Error: No data found for {site_name}')
+        return
+
+    pyramid = {level: xr.concat(level_days, dim='time') for level, level_days in reduced.items()}
+    for level_ds in pyramid.values():
+        level_ds.attrs['site'] = site_name
+    if output is not None:
+        write_pyramid(pyramid, output)
+    return pyramid
+
+
+
+def write_pyramid(pyramid, path, complevel=4):
+    """
+    Writes a pyramid to a NetCDF file with one group per level.
+
+    Parameters:
+    - pyramid: Dictionary of level datasets (see build_pyramid).
+    - path: Output path.
+    - complevel: zlib compression level.
+    """
+
+    xr.Dataset(attrs={'levels': ','.join(pyramid)}).to_netcdf(path, mode='w')
+    for level, level_ds in pyramid.items():
+        encoding = {name: {'zlib': True, 'complevel': complevel} for name in level_ds.data_vars}
+        level_ds.to_netcdf(path, mode='a', group=level, encoding=encoding)
+
+
+
+def open_pyramid(path):
+    """
+    Lazily opens a pyramid written by write_pyramid; only the slices that are plotted are read.
+
+    Parameters:
+    - path: Pyramid path.
+
+    Returns:
+    - Dictionary of xarray.Datasets keyed by level name.
+    """
+
+    with xr.open_dataset(path) as root:
+        levels = root.attrs['levels'].split(',')
+    return {level: xr.open_dataset(path, group=level) for level in levels}
+
+
+
+def select_level(pyramid, start, end, max_columns):
+    """
+    Picks the finest level of a pyramid that covers [start, end] with at most max_columns time buckets.
+
+    Parameters:
+    - pyramid: Dictionary of level datasets.
+    - start, end: numpy.datetime64 bounds of the span.
+    - max_columns: Largest number of columns wanted (e.g., the width of the figure in pixels).
+
+    Returns:
+    - The name of the selected level (the coarsest level if none is fine enough).
+    """
+
+    span = (np.datetime64(end, 'm') - np.datetime64(start, 'm')).astype(np.int64) + 1
+    levels = sorted(pyramid, key=lambda level: pyramid[level].attrs['minutes'])
+    for level in levels:
+        if span / pyramid[level].attrs['minutes'] <= max_columns:
+            return level
+    return levels[-1]
+
+
+
+def _reduce(minutes, size, total, peak, count):
+    """
+    Combines rows of (sum, max, count) statistics into buckets of size minutes, given the (increasing) minute of each row.
+
+    Returns:
+    - (bucket start minutes, sum, max, count) of the non-empty buckets.
+    """
+
+    buckets = minutes // size * size
+    if buckets.size == 0:
+        return buckets, total, peak, count
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    return (buckets[starts], np.add.reduceat(total, starts, axis=0), np.fmax.reduceat(peak, starts, axis=0),
+            np.add.reduceat(count, starts, axis=0))
@@ -7,12 +7,44 @@ __year__        = "2024"
 __institution__   = "University of Michigan"
 
 import xarray as xr
+import pandas as pd
+import numpy as np
+import asyncio
+import contextlib
+import contextvars
 import glob
 import os
-from functools import reduce
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from . import pcache
+from . import pconfig
 
+FILE_PATTERNS = {
+    'edensity_lwe_rate': 'adjusted_edensity_lwe_rate/*.nc',
+    'edensity_distributions': 'edensity_distributions/*.nc',
+    'particle_size_distributions': 'particle_size_distributions/*.nc',
+    'velocity_distributions': 'velocity_distributions/*.nc',
+}
 
-def get_precip_data_for_day(base_dir, site_name, year, month, day):
+COMPACT_VARIABLES = {
+    'edensity_distributions_rho': 'edensity_distributions',
+    'particle_size_distributions_psd': 'particle_size_distributions',
+    'velocity_distributions_vvd': 'velocity_distributions',
+}
+ROW_SUFFIX = '_row'
+
+RAW_VARIABLES = {
+    'ed': 'edensity_lwe_rate', 'rr': 'edensity_lwe_rate', 'nrr': 'edensity_lwe_rate',
+    'ed_adj': 'edensity_lwe_rate', 'rr_adj': 'edensity_lwe_rate', 'nrr_adj': 'edensity_lwe_rate',
+    'rho': 'edensity_distributions', 'psd': 'particle_size_distributions', 'vvd': 'velocity_distributions',
+}
+
+
+def get_precip_data_for_day(base_dir, site_name, year, month, day, catalog=None, compact=None):
     """
     Fetch precipitation data for a given site, year, month, and day.
     
@@ -21,6 +53,8 @@ def get_precip_data_for_day(base_dir, site_name, year, month, day):
     - year: The year (YYYY)
     - month: The month (MM)
     - day: The day (DD)
+    - catalog: Optional pcatalog.Catalog used for file lookups instead of the filesystem.
+    - compact: Optional compact layout for the 2D distributions, either 'float32' or 'sparse' (see compact_distributions).
     
     Returns:
     - An xarray.Dataset containing all data variables for the specified period.
@@ -37,41 +71,40 @@ def get_precip_data_for_day(base_dir, site_name, year, month, day):
             
     for data_type, pattern in file_patterns.items():
         file_path_pattern = os.path.join(base_dir, pattern.format(year=int(year), month=int(month), day=int(day)))
-        files = glob.glob(file_path_pattern)
+        files = _glob(file_path_pattern, catalog, data_type)
 
         if len(files) == 0:
             print(f'Error: No data found for at {site_name} on {year}{month}{day}')
             return
         
         for file in files:
-            data = xr.open_dataset(file)
-            
-            for variable in data.variables:
-                if variable not in ['lat', 'lon', 'time']:
-                    new_name = f"{data_type}_{variable}" if variable not in ['ed_adj', 'nrr_adj', 'rr_adj'] else variable
-                    data = data.rename({variable: new_name})
-            
-            dataset = xr.merge([dataset, data])
+            with _stage('open', data_type, file):
+                data = xr.open_dataset(file)
+            with _stage('rename', data_type):
+                data = _rename_variables(data, data_type)
+            with _stage('merge', data_type):
+                dataset = xr.merge([dataset, data])
     
-    return dataset
+    return _compact(dataset, compact)
 
 
 
-def get_common_dates(base_dir, file_patterns):
+def get_common_dates(base_dir, file_patterns, catalog=None):
     """
     Identifies common dates across different data types based on available files.
     
     Parameters:
     - base_dir: Base directory for the data.
     - file_patterns: Dictionary of file patterns for different data types.
+    - catalog: Optional pcatalog.Catalog used for file lookups instead of the filesystem.
     
     Returns:
     - A set of dates (YYYYMMDD) that are common across all data types.
     """
 
     date_sets = []
-    for pattern in file_patterns.values():
-        files = glob.glob(os.path.join(base_dir, pattern))
+    for data_type, pattern in file_patterns.items():
+        files = _glob(os.path.join(base_dir, pattern), catalog, data_type)
         dates = {os.path.basename(f).split('_')[0] for f in files}
         date_sets.append(dates)
     
@@ -80,118 +113,1051 @@ def get_common_dates(base_dir, file_patterns):
 
 
 
-def load_single_year_data(base_dir, site_name, year):
-    
-    file_patterns = {
-        'edensity_lwe_rate': f'adjusted_edensity_lwe_rate/*.nc',
-        'edensity_distributions': f'edensity_distributions/*.nc',
-        'particle_size_distributions': f'particle_size_distributions/*.nc',
-        'velocity_distributions': f'velocity_distributions/*.nc',
-    }
-    
-    common_dates = get_common_dates(base_dir, file_patterns)
-    
-    all_data = []
-    for date in common_dates:
-        daily_data = []
-        for data_type, pattern in file_patterns.items():
-            specific_pattern = pattern.replace(f'{year}', str(year)).replace('*', date + "*")
-            file_path = os.path.join(base_dir, specific_pattern)
-            files = glob.glob(file_path)
+def load_single_year_data(base_dir, site_name, year, n_jobs=None, executor='thread', cache_dir=None, catalog=None, compact=None,
+                          reader='xarray'):
+    """
+    Loads a full year of data for a site, keeping only the dates where all data types are present.
 
-            if len(files) == 0:
-                print(f'Error: No data found for at {site_name} on {year}')
-                return
-            
-            for file in files:
-                data = xr.open_dataset(file)
-                for variable in data.variables:
-                    if variable not in ['lat', 'lon', 'time']:
-                        new_name = f"{data_type}_{variable}" if variable not in ['ed_adj', 'nrr_adj', 'rr_adj'] else variable
-                        data = data.rename({variable: new_name})
-                daily_data.append(data)
-        
-        if daily_data:
-            merged_daily_data = reduce(lambda x, y: xr.merge([x, y]), daily_data)
-            all_data.append(merged_daily_data)
-    
-    if all_data:
-        merged_yearly_data = reduce(lambda x, y: xr.concat([x, y], dim='time'), all_data)
-        return merged_yearly_data
-    else:
-        return xr.Dataset()
+    Parameters:
+    - base_dir: Base directory for the site-year data (i.e., the netCDF folder).
+    - site_name: The site name (e.g., "SITE")
+    - year: The year (YYYY)
+    - n_jobs: Number of workers used to open the daily files (default: one per CPU).
+    - executor: Worker pool type, either 'thread' or 'process'.
+    - cache_dir: Optional directory for a consolidated site-year cache, rebuilt when the source files change.
+    - catalog: Optional pcatalog.Catalog used for file lookups instead of the filesystem.
+    - compact: Optional compact layout for the 2D distributions, either 'float32' or 'sparse' (see compact_distributions).
+    - reader: 'xarray' opens and merges each daily file with xarray; 'netcdf4' reads the files with netCDF4 straight
+              into arrays preallocated for the whole year (n_jobs and executor are then unused).
+
+    Returns:
+    - An xarray.Dataset with all days concatenated along time in date order.
+    """
+
+    if cache_dir is not None:
+        signature = pcache.source_signature(base_dir, FILE_PATTERNS, catalog)
+        with _stage('cache_read', path=pcache.cache_path(cache_dir, site_name, year, compact)):
+            cached = pcache.read_cached(cache_dir, site_name, year, signature, compact)
+        if cached is not None:
+            return cached
+
+    common_dates = get_common_dates(base_dir, FILE_PATTERNS, catalog)
+    year_data = _read_year(base_dir, sorted(common_dates), FILE_PATTERNS, n_jobs, executor, catalog, compact, reader, strict=True)
 
+    if year_data is None:
+        print(f'Error: No data found for at {site_name} on {year}')
+        return
 
+    if cache_dir is not None:
+        with _stage('cache_write', path=pcache.cache_path(cache_dir, site_name, year, compact)):
+            pcache.write_cached(year_data, cache_dir, site_name, year, signature, compact)
+    return year_data
 
-def load_data_for_sites(main_path, sites_to_include):
+
+
+def load_data_for_sites(main_path, sites_to_include, n_jobs=None, executor='thread', cache_dir=None, catalog=None, compact=None,
+                        site_jobs=4, memory_budget=None, progress=None, reader='xarray'):
     """
     Loads data into xarray datasets for specified sites and allows for easy comparison between sites and years.
 
+    Each site-year is loaded as its own task in a pool of site_jobs threads, and all of them share one pool of
+    n_jobs day workers, so no more than n_jobs files are read at once whatever the number of site-years. A site-year
+    that fails (e.g., because of a corrupt file) is reported and skipped, and the remaining site-years are still
+    returned.
+
     Parameters:
     - main_path: The main directory path where YEAR_SITE subfolders are located.
     - sites_to_include: A list of sites to include in the loading process.
+    - n_jobs: Number of workers, shared by all site-years, used to open the daily files (default: one per CPU).
+    - executor: Worker pool type, either 'thread' or 'process'.
+    - cache_dir: Optional directory for consolidated site-year caches, rebuilt when the source files change.
+    - catalog: Optional pcatalog.Catalog used for file lookups instead of the filesystem.
+    - compact: Optional compact layout for the 2D distributions, either 'float32' or 'sparse' (see compact_distributions).
+    - site_jobs: Number of site-years loaded concurrently.
+    - memory_budget: Optional limit (in bytes) on the estimated size of the site-years being loaded at the same time.
+    - progress: Optional callback called as progress(year_site, seconds, error) when each site-year finishes
+                (error is None on success). By default a line is printed per site-year.
+    - reader: 'xarray' or 'netcdf4' (see load_single_year_data).
 
     Returns:
-    - A dictionary of xarray datasets keyed by 'YEAR_SITE'.
+    - A dictionary of xarray datasets keyed by 'YEAR_SITE' (failed site-years are left out).
     """
     
-    datasets = {}
-    
-    year_site_dirs = [d for d in os.listdir(main_path) if os.path.isdir(os.path.join(main_path, d))]
-    
-    for year_site in year_site_dirs:
-        _, site_name = year_site.split('_')
-        
-        if site_name in sites_to_include:
-            year, site = year_site.split('_')
-            
-            base_dir = os.path.join(main_path, year_site, 'netCDF')
-            
-            file_patterns = {
-                'edensity_lwe_rate': 'adjusted_edensity_lwe_rate/*.nc',
-                'edensity_distributions': 'edensity_distributions/*.nc',
-                'particle_size_distributions': 'particle_size_distributions/*.nc',
-                'velocity_distributions': 'velocity_distributions/*.nc',
-            }
-            
-            common_dates = get_common_dates(base_dir, file_patterns)
-            year_data = load_year_data(site, year, base_dir, common_dates, file_patterns)
-            
-            datasets[f"{year}_{site}"] = year_data
-    
-    return datasets
+    if catalog is not None:
+        year_site_dirs = catalog.year_sites()
+    else:
+        year_site_dirs = [d for d in os.listdir(main_path) if os.path.isdir(os.path.join(main_path, d))]
+    year_site_dirs = sorted(d for d in year_site_dirs if '_' in d and d.split('_')[1] in sites_to_include)
+
+    # one day-level pool for every site-year, so the site_jobs tasks never start site_jobs x n_jobs workers
+    day_workers = None
+    if n_jobs != 1:
+        day_workers = (ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor)(max_workers=n_jobs or os.cpu_count())
+
+    budget = _MemoryBudget(memory_budget)
+    load_site_year = partial(_load_site_year, main_path=main_path, n_jobs=n_jobs, executor=day_workers or executor,
+                             cache_dir=cache_dir, catalog=catalog, compact=compact, budget=budget,
+                             progress=progress or _print_progress, reader=reader)
+
+    try:
+        with ThreadPoolExecutor(max_workers=site_jobs) as workers:
+            results = list(workers.map(_bind_stats(load_site_year), year_site_dirs))
+    finally:
+        if day_workers is not None:
+            day_workers.shutdown()
+
+    return {year_site: year_data for year_site, year_data in zip(year_site_dirs, results) if year_data is not None}
+
+def _load_site_year(year_site, main_path, n_jobs, executor, cache_dir, catalog, compact, budget, progress, reader='xarray'):
+    """
+    Loads (or reads from the cache) one YEAR_SITE folder for load_data_for_sites, reporting its timing or error.
+    """
+
+    started = time.perf_counter()
+    year, site = year_site.split('_')
+    base_dir = os.path.join(main_path, year_site, 'netCDF')
+    reserved = 0
+
+    try:
+        if cache_dir is not None:
+            signature = pcache.source_signature(base_dir, FILE_PATTERNS, catalog)
+            with _stage('cache_read', path=pcache.cache_path(cache_dir, site, year, compact)):
+                year_data = pcache.read_cached(cache_dir, site, year, signature, compact)
+            if year_data is not None:
+                progress(year_site, time.perf_counter() - started, None)
+                return year_data
+
+        common_dates = get_common_dates(base_dir, FILE_PATTERNS, catalog)
+        reserved = budget.acquire(_estimate_nbytes(len(common_dates), compact))
+        year_data = load_year_data(site, year, base_dir, common_dates, FILE_PATTERNS, n_jobs, executor, catalog, compact, reader)
+
+        if cache_dir is not None:
+            with _stage('cache_write', path=pcache.cache_path(cache_dir, site, year, compact)):
+                pcache.write_cached(year_data, cache_dir, site, year, signature, compact)
+
+    except Exception as error:
+        progress(year_site, time.perf_counter() - started, error)
+        return None
+
+    finally:
+        budget.release(reserved)
+
+    progress(year_site, time.perf_counter() - started, None)
+    return year_data
+
+def _print_progress(year_site, seconds, error):
+    if error is None:
+        print(f'Loaded: {year_site} in {seconds:.1f} s')
+    else:
+        print(f'Error: Failed to load {year_site} after {seconds:.1f} s ({type(error).__name__}: {error})')
+
+def _estimate_nbytes(n_days, compact=None):
+    """
+    Rough in-memory size of a site-year: three 131-bin distributions and ~10 1D variables per minute.
+    """
+
+    itemsize = 8 if compact is None else 4
+    return n_days * 1440 * (3 * 131 * itemsize + 10 * 8)
+
+class _MemoryBudget:
+    """
+    Blocks site-year loads until their estimated size fits in the remaining budget (one load may always proceed).
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, nbytes):
+        if self.limit is None:
+            return 0
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_use == 0 or self.in_use + nbytes <= self.limit)
+            self.in_use += nbytes
+        return nbytes
+
+    def release(self, nbytes):
+        if self.limit is None or nbytes == 0:
+            return
+        with self._condition:
+            self.in_use -= nbytes
+            self._condition.notify_all()
+
+def load_range(site_name, start, end, variables=None, time_of_day=None, main_path=None, n_jobs=None, executor='thread', catalog=None, compact=None,
+               days=None, minutes=None):
+    """
+    Loads a date range for one site, reading only the data types needed for the requested variables.
+
+    Parameters:
+    - site_name: The site name (e.g., "SITE")
+    - start: First date to load (e.g., '2018-01-15'), inclusive.
+    - end: Last date to load (e.g., '2018-03-01'), inclusive. The range may cross YEAR_SITE folders.
+    - variables: Optional list of variables to keep, using either the merged names (e.g., 'particle_size_distributions_psd')
+                 or the file names (e.g., 'psd', 'ed_adj'). Data types holding none of them are never opened.
+    - time_of_day: Optional ('HH:MM', 'HH:MM') slice, or list of slices, of minutes to keep each day (end exclusive).
+    - main_path: The main directory path where YEAR_SITE subfolders are located (default: the catalog's, else pconfig.MAIN_PATH).
+    - n_jobs: Number of workers used to open the daily files (default: one per CPU).
+    - executor: Worker pool type, either 'thread' or 'process'.
+    - catalog: Optional pcatalog.Catalog used for file lookups instead of the filesystem.
+    - compact: Optional compact layout for the 2D distributions, either 'float32' or 'sparse' (see compact_distributions).
+    - days: Optional day filter answered from the catalog's availability index: 'data' skips days where every
+            loaded file is all NaN, 'precip' skips days without precipitation (see pcatalog.Catalog.available_dates).
+    - minutes: Optional minute filter answered from the same index: 'valid' keeps the minutes where any loaded file
+               holds valid data, 'precip' the precipitating minutes, or a variable name (e.g., 'psd') the minutes
+               where that variable's file holds valid data.
+
+    Returns:
+    - An xarray.Dataset with the requested days concatenated along time in date order. Raises FileNotFoundError if
+      no YEAR_SITE folder of the site covers the range.
+    """
+
+    start = pd.Timestamp(start).strftime('%Y%m%d')
+    end = pd.Timestamp(end).strftime('%Y%m%d')
+    file_patterns, variables = _patterns_for_variables(variables)
+
+    tasks = _list_days(site_name, start, end, file_patterns, main_path, catalog, days, minutes)
+    daily_data = _load_days([task[2] for task in tasks], [task[3] for task in tasks], file_patterns, n_jobs, executor, catalog,
+                            variables=variables, time_of_day=time_of_day, compact=compact, minutes=minutes)
+    return _concat_days(daily_data)
+
+def iter_days(site_names, start=None, end=None, prefetch=2, variables=None, time_of_day=None, main_path=None, catalog=None,
+              compact=None, errors='raise', days=None, minutes=None):
+    """
+    Yields merged daily datasets in date order, loading the next days in the background while the caller works.
+
+    At most prefetch days are loaded ahead of the one being processed, so memory stays bounded by roughly
+    prefetch + 1 days however long the range is.
+
+    Parameters:
+    - site_names: A site name (e.g., "SITE") or a list of sites; days of different sites are interleaved in date order.
+    - start: Optional first date (e.g., '2018-01-15'), inclusive.
+    - end: Optional last date (e.g., '2018-03-01'), inclusive.
+    - prefetch: Number of days loaded ahead in worker threads (0 loads each day only when it is requested).
+    - variables: Optional list of variables to keep (see load_range).
+    - time_of_day: Optional ('HH:MM', 'HH:MM') slice, or list of slices, of minutes to keep each day (see load_range).
+    - main_path: The main directory path where YEAR_SITE subfolders are located (default: the catalog's, else pconfig.MAIN_PATH).
+    - catalog: Optional pcatalog.Catalog used for file lookups instead of the filesystem.
+    - compact: Optional compact layout for the 2D distributions, either 'float32' or 'sparse' (see compact_distributions).
+    - errors: 'raise' to stop at the first day that fails to load, or 'skip' to report it and continue.
+    - days, minutes: Optional day and minute filters answered from the catalog's availability index (see load_range).
+
+    Returns:
+    - A generator of (site, date, xarray.Dataset) tuples, with date as a pandas.Timestamp.
+    """
+
+    start = pd.Timestamp(start).strftime('%Y%m%d') if start is not None else None
+    end = pd.Timestamp(end).strftime('%Y%m%d') if end is not None else None
+    file_patterns, variables = _patterns_for_variables(variables)
+    load_day = _bind_stats(partial(_load_day, file_patterns=file_patterns, catalog=catalog, variables=variables,
+                                   time_of_day=time_of_day, compact=compact, minutes=minutes))
+
+    workers = ThreadPoolExecutor(max_workers=max(prefetch, 1))
+    pending = deque()
+    try:
+        for task in _list_days(site_names, start, end, file_patterns, main_path, catalog, days, minutes):
+            pending.append((task, workers.submit(load_day, task[2], task[3])))
+            while len(pending) > prefetch:
+                day = _day_result(*pending.popleft(), errors)
+                if day is not None:
+                    yield day
+        while pending:
+            day = _day_result(*pending.popleft(), errors)
+            if day is not None:
+                yield day
+    finally:
+        workers.shutdown(wait=True, cancel_futures=True)
 
-def load_year_data(site_name, year, base_dir, common_dates, file_patterns):
+async def aiter_days(site_names, start=None, end=None, prefetch=2, variables=None, time_of_day=None, main_path=None, catalog=None,
+                     compact=None, errors='raise', days=None, minutes=None):
+    """
+    Async variant of iter_days: yields the same (site, date, xarray.Dataset) tuples from an async generator,
+    loading the files in worker threads so the event loop is never blocked.
+
+    Parameters:
+    - See iter_days.
+
+    Returns:
+    - An async generator of (site, date, xarray.Dataset) tuples.
+    """
+
+    start = pd.Timestamp(start).strftime('%Y%m%d') if start is not None else None
+    end = pd.Timestamp(end).strftime('%Y%m%d') if end is not None else None
+    file_patterns, variables = _patterns_for_variables(variables)
+    load_day = _bind_stats(partial(_load_day, file_patterns=file_patterns, catalog=catalog, variables=variables,
+                                   time_of_day=time_of_day, compact=compact, minutes=minutes))
+
+    loop = asyncio.get_running_loop()
+    tasks = await loop.run_in_executor(None, _bind_stats(_list_days), site_names, start, end, file_patterns, main_path, catalog, days, minutes)
+
+    workers = ThreadPoolExecutor(max_workers=max(prefetch, 1))
+    pending = deque()
+    try:
+        for task in tasks:
+            pending.append((task, loop.run_in_executor(workers, load_day, task[2], task[3])))
+            while len(pending) > prefetch:
+                task, future = pending.popleft()
+                await asyncio.wait([future])
+                day = _day_result(task, future, errors)
+                if day is not None:
+                    yield day
+        while pending:
+            task, future = pending.popleft()
+            await asyncio.wait([future])
+            day = _day_result(task, future, errors)
+            if day is not None:
+                yield day
+    finally:
+        for _, future in pending:
+            future.cancel()
+        workers.shutdown(wait=False, cancel_futures=True)
+
+def _day_result(task, future, errors='raise'):
+    """
+    Turns a finished day load from iter_days/aiter_days into a (site, date, dataset) tuple (None if skipped).
+    """
+
+    date, site, base_dir, prefix = task
+    try:
+        ds = future.result()
+    except Exception as error:
+        if errors != 'skip':
+            raise
+        print(f'Error: Failed to load {site} on {date} ({type(error).__name__}: {error})')
+        return None
+    return site, pd.Timestamp(date), ds
+
+def load_year_data(site_name, year, base_dir, common_dates, file_patterns, n_jobs=None, executor='thread', catalog=None, compact=None,
+                   reader='xarray'):
     """
     Alt version of the previously defined load_year_data to accept base_dir and common_dates directly. # TODO: combine later?
+    Days missing a data type are still loaded with whatever data types are available.
     """
 
     print("Loading:", site_name, year)
-    all_data = []
-    for date in common_dates:
-        daily_data = []
-        for data_type, pattern in file_patterns.items():
-            specific_pattern = pattern.replace('*', date + "*")
-            file_path = os.path.join(base_dir, specific_pattern)
-            files = glob.glob(file_path)
+    return _read_year(base_dir, sorted(common_dates), file_patterns, n_jobs, executor, catalog, compact, reader)
 
-            if len(files) == 0:
-                continue 
 
-            for file in files:
-                data = xr.open_dataset(file)
-                for variable in data.variables:
-                    if variable not in ['lat', 'lon', 'time']:
-                        new_name = f"{data_type}_{variable}" if variable not in ['ed_adj', 'nrr_adj', 'rr_adj'] else variable
-                        data = data.rename({variable: new_name})
-                daily_data.append(data)
-        
-        if daily_data:
-            merged_daily_data = reduce(lambda x, y: xr.merge([x, y]), daily_data)
-            all_data.append(merged_daily_data)
-    
-    if all_data:
-        merged_yearly_data = reduce(lambda x, y: xr.concat([x, y], dim='time'), all_data)
-        return merged_yearly_data
+
+def compact_distributions(ds, sparse=True, dtype='float32'):
+    """
+    Converts the 2D distribution variables (PSD, VVD, rho) to a compact in-memory layout.
+
+    The values are cast to dtype. With sparse=True, only minutes holding at least one non-zero value are kept,
+    on a '<data type>_rows' dimension, and a '<variable>_row' index on time points each minute at its row
+    (-1 for an all-NaN minute, -2 for an all-zero minute). Selecting or splitting along time only touches the
+    small index, so the rows are shared rather than copied. The pcalc and pplot functions accept both layouts.
+
+    Parameters:
+    - ds: xarray.Dataset containing the PIP data.
+    - sparse: If True, drop empty minutes from the distributions as described above.
+    - dtype: Storage type of the distribution values.
+
+    Returns:
+    - An xarray.Dataset with the distributions in compact layout (other variables are unchanged).
+    """
+
+    for name, data_type in COMPACT_VARIABLES.items():
+        if name not in ds or is_compact(ds, name):
+            continue
+
+        data_array = ds[name].astype(dtype)
+        if not sparse:
+            ds = ds.assign({name: data_array})
+            continue
+
+        values = data_array.values
+        all_nan = np.isnan(values).all(axis=1)
+        all_zero = ~all_nan & (np.nan_to_num(values) == 0).all(axis=1)
+        kept = ~all_nan & ~all_zero
+
+        row = np.full(values.shape[0], -1, dtype=np.int32)
+        row[all_zero] = -2
+        row[kept] = np.arange(np.count_nonzero(kept), dtype=np.int32)
+
+        rows_dim = f'{data_type}_rows'
+        rows = xr.DataArray(values[kept], dims=(rows_dim, data_array.dims[1]),
+                            coords={data_array.dims[1]: data_array[data_array.dims[1]]}, attrs=data_array.attrs)
+        ds = ds.drop_vars(name).assign({name: rows, name + ROW_SUFFIX: ('time', row)})
+
+    return ds
+
+
+
+def expand_distributions(ds, variables=None):
+    """
+    Converts compact distributions (see compact_distributions) back to dense (time, bin) variables.
+
+    Parameters:
+    - ds: xarray.Dataset containing the PIP data.
+    - variables: Optional list of distribution variables to expand (default: all compact ones).
+
+    Returns:
+    - An xarray.Dataset with dense distribution variables.
+    """
+
+    for name in variables if variables is not None else COMPACT_VARIABLES:
+        if not is_compact(ds, name):
+            continue
+        dense = np.concatenate(list(distribution_blocks(ds, name)))
+        bin_dim, attrs = ds[name].dims[1], ds[name].attrs
+        ds = ds.drop_vars([name, name + ROW_SUFFIX])
+        ds = ds.assign({name: (('time', bin_dim), dense, attrs)})
+
+    return ds
+
+
+
+def is_compact(ds, name):
+    """
+    True if the distribution variable name is stored in the sparse compact layout.
+    """
+
+    return name + ROW_SUFFIX in ds
+
+
+
+def distribution_blocks(ds, name, chunk_size=10080):
+    """
+    Yields dense numpy blocks of a distribution variable, chunk_size minutes at a time, for either layout.
+
+    Parameters:
+    - ds: xarray.Dataset containing the PIP data.
+    - name: Distribution variable name (e.g., 'particle_size_distributions_psd').
+    - chunk_size: Number of minutes per block.
+
+    Returns:
+    - Generator of (minutes, bins) arrays covering ds.time in order.
+    """
+
+    n_times = ds.sizes['time']
+    if not is_compact(ds, name):
+        for start in range(0, n_times, chunk_size):
+            yield ds[name].isel(time=slice(start, start + chunk_size)).values
+        return
+
+    rows = ds[name].values
+    row_index = ds[name + ROW_SUFFIX].values
+    for start in range(0, n_times, chunk_size):
+        index = row_index[start:start + chunk_size]
+        block = np.take(rows, np.clip(index, 0, None), axis=0, mode='clip') if rows.shape[0] else \
+            np.empty((index.size, rows.shape[1]), dtype=rows.dtype)
+        block[index == -1] = np.nan
+        block[index == -2] = 0
+        yield block
+
+
+
+class LoadStats:
+    """
+    Wall time, call counts, files opened and the size of those files for the pread loaders, per stage and per product.
+
+    file_bytes is the on-disk size of each file opened, read or written (not the number of bytes actually read,
+    which is smaller when only some variables or minutes are loaded).
+
+    Stages are 'glob', 'open' (xr.open_dataset), 'rename', 'read' (loading the values), 'merge', 'concat',
+    'cache_read' and 'cache_write'. Create one with the instrument() context manager.
+    """
+
+    def __init__(self, callback=None):
+        """
+        Parameters:
+        - callback: Optional callable receiving one dictionary per recorded event
+                    (stage, product, seconds, path, file_bytes, error).
+        """
+
+        self.stages = {}
+        self.files = {}
+        self.errors = []
+        self.callback = callback
+        self._lock = threading.Lock()
+
+    def record(self, stage, product, seconds, path=None, nbytes=0, error=None):
+        with self._lock:
+            totals = self.stages.setdefault((stage, product), [0.0, 0, 0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+            if path is not None:
+                totals[2] += stage == 'open'
+                totals[3] += nbytes
+                file_totals = self.files.setdefault(path, [0.0, 0])
+                file_totals[0] += seconds
+                file_totals[1] = max(file_totals[1], nbytes)
+            if error is not None:
+                self.errors.append((stage, product, path, error))
+
+        if self.callback is not None:
+            self.callback({'stage': stage, 'product': product, 'seconds': seconds, 'path': path, 'file_bytes': nbytes, 'error': error})
+
+    def summary(self):
+        """
+        Returns a pandas.DataFrame with one row per (stage, product) and columns seconds, calls, files and file_bytes.
+        """
+
+        with self._lock:
+            rows = [(stage, product, *totals) for (stage, product), totals in self.stages.items()]
+        summary = pd.DataFrame(rows, columns=['stage', 'product', 'seconds', 'calls', 'files', 'file_bytes'])
+        return summary.sort_values('seconds', ascending=False, ignore_index=True)
+
+    def slowest_files(self, n=10):
+        """
+        Returns the n files with the largest total open + read time as (path, seconds, file_bytes) tuples.
+        """
+
+        with self._lock:
+            files = sorted(self.files.items(), key=lambda item: item[1][0], reverse=True)[:n]
+        return [(path, seconds, nbytes) for path, (seconds, nbytes) in files]
+
+    def report(self, n_files=5):
+        """
+        Prints the per-stage summary, the slowest files and any errors.
+        """
+
+        print(self.summary().to_string(index=False))
+        print('Slowest files:')
+        for path, seconds, nbytes in self.slowest_files(n_files):
+            print(f'  {seconds:.3f} s  {nbytes / 1024**2:.1f} MB  {path}')
+        for stage, product, path, error in self.errors:
+            print(f'Error: {stage} failed for {path or product}: {error}')
+
+class _Stage:
+    def __init__(self, stats, stage, product, path):
+        self.stats = stats
+        self.stage = stage
+        self.product = product
+        self.path = path
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        nbytes = 0
+        if self.path is not None and self.stage in ['open', 'cache_read', 'cache_write'] and os.path.exists(self.path):
+            nbytes = os.path.getsize(self.path)
+        error = None if exc is None else f'{exc_type.__name__}: {exc}'
+        self.stats.record(self.stage, self.product, time.perf_counter() - self.started, self.path, nbytes, error)
+        return False
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+_NULL_STAGE = _NullStage()
+_ACTIVE_STATS = contextvars.ContextVar('pipdb_load_stats', default=None)
+
+def _stage(stage, product=None, path=None):
+    """
+    Times a block as one stage event when instrumentation is active (a shared no-op otherwise).
+    """
+
+    stats = _ACTIVE_STATS.get()
+    if stats is None:
+        return _NULL_STAGE
+    return _Stage(stats, stage, product, path)
+
+def _bind_stats(func):
+    """
+    Wraps func so it records into the caller's active LoadStats when run in a worker thread
+    (pool threads do not inherit the caller's context variables).
+    """
+
+    stats = _ACTIVE_STATS.get()
+    if stats is None:
+        return func
+
+    def bound(*args, **kwargs):
+        token = _ACTIVE_STATS.set(stats)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _ACTIVE_STATS.reset(token)
+    return bound
+
+@contextlib.contextmanager
+def instrument(callback=None, logger=None):
+    """
+    Records per-stage timings, file counts and file sizes for every pread load inside the block.
+
+    The active stats are held in a context variable and handed to the loaders' worker threads explicitly, so
+    blocks running in different threads (or asyncio tasks) each record only their own loads, whatever order they
+    exit in. With executor='process' only the stages run in the calling process (globbing, concatenation and
+    caching) are recorded.
+
+    Parameters:
+    - callback: Optional callable receiving one dictionary per event (stage, product, seconds, path, file_bytes, error).
+    - logger: Optional logging.Logger (or logger name) that each event is also sent to at DEBUG level.
+
+    Returns:
+    - A LoadStats object, filled in as the block runs.
+    """
+
+    if logger is not None:
+        logger = logging.getLogger(logger) if isinstance(logger, str) else logger
+        user_callback = callback
+
+        def callback(event):
+            logger.debug('%s %s %.4f s %s%s', event['stage'], event['product'], event['seconds'], event['path'] or '',
+                         f" ({event['error']})" if event['error'] else '')
+            if user_callback is not None:
+                user_callback(event)
+
+    stats = LoadStats(callback)
+    token = _ACTIVE_STATS.set(stats)
+    try:
+        yield stats
+    finally:
+        _ACTIVE_STATS.reset(token)
+
+
+
+def _rename_variables(data, data_type):
+    """
+    Prefixes each data variable with its data type so the four daily products can be merged together.
+    """
+
+    for variable in data.variables:
+        if variable not in ['lat', 'lon', 'time']:
+            new_name = f"{data_type}_{variable}" if variable not in ['ed_adj', 'nrr_adj', 'rr_adj'] else variable
+            data = data.rename({variable: new_name})
+    return data
+
+
+
+def _glob(pattern, catalog=None, product=None):
+    """
+    Resolves a file pattern from the catalog if one is given, otherwise from the filesystem.
+    """
+
+    with _stage('glob', product):
+        if catalog is not None:
+            return catalog.glob(pattern)
+        return sorted(glob.glob(pattern))
+
+
+
+def _merged_variable_name(variable):
+    """
+    Maps a file variable name (e.g., 'psd') to its merged dataset name (e.g., 'particle_size_distributions_psd').
+    """
+
+    if variable in RAW_VARIABLES and variable not in ['ed_adj', 'nrr_adj', 'rr_adj']:
+        return f"{RAW_VARIABLES[variable]}_{variable}"
+    return variable
+
+
+
+def _product_for_variable(variable):
+    """
+    Returns the data type (key of FILE_PATTERNS) that holds a merged variable name.
+    """
+
+    if variable in RAW_VARIABLES:
+        return RAW_VARIABLES[variable]
+    for data_type in FILE_PATTERNS:
+        if variable.startswith(data_type + '_'):
+            return data_type
+    raise ValueError(f'Unknown PIP variable: {variable}')
+
+
+
+def _patterns_for_variables(variables=None):
+    """
+    Returns the file patterns of the data types holding the requested variables, and the merged variable names.
+    """
+
+    if variables is None:
+        return FILE_PATTERNS, None
+    variables = [_merged_variable_name(variable) for variable in variables]
+    products = {_product_for_variable(variable) for variable in variables}
+    return {data_type: pattern for data_type, pattern in FILE_PATTERNS.items() if data_type in products}, variables
+
+
+
+def _list_days(site_names, start=None, end=None, file_patterns=FILE_PATTERNS, main_path=None, catalog=None, days=None, minutes=None):
+    """
+    Lists the days with every data type present for one or more sites, optionally between start and end (YYYYMMDD)
+    and passing the days filter (see load_range).
+
+    Returns:
+    - Sorted list of (YYYYMMDD, site, base_dir, date prefix) tuples.
+    """
+
+    main_path = _resolve_main_path(main_path, catalog)
+    site_names = [site_names] if isinstance(site_names, str) else list(site_names)
+
+    allowed = None
+    if days is not None or minutes is not None:
+        if catalog is None:
+            raise ValueError('The days and minutes filters need a catalog with an availability index (see pcatalog.open_catalog)')
+        if days is not None:
+            products = [os.path.dirname(pattern) for pattern in file_patterns.values()]
+            allowed = {site: set(catalog.available_dates(site, days, products)) for site in site_names}
+        else:
+            catalog.update_availability(site_names)
+
+    if catalog is not None:
+        year_site_dirs = catalog.year_sites()
     else:
-        return xr.Dataset()
\ No newline at end of file
+        year_site_dirs = [d for d in os.listdir(main_path) if os.path.isdir(os.path.join(main_path, d))]
+
+    tasks = []
+    matched = 0
+    for year_site in year_site_dirs:
+        if '_' not in year_site:
+            continue
+        year, site = year_site.split('_')
+        if site not in site_names:
+            continue
+        # a YEAR_SITE folder may hold a few days of the neighbouring years
+        if (start is not None and int(year) < int(start[:4]) - 1) or (end is not None and int(year) > int(end[:4]) + 1):
+            continue
+
+        matched += 1
+        base_dir = os.path.join(main_path, year_site, 'netCDF')
+        for date in get_common_dates(base_dir, file_patterns, catalog):
+            if (start is None or start <= date[-8:]) and (end is None or date[-8:] <= end):
+                if allowed is None or date[-8:] in allowed[site]:
+                    tasks.append((date[-8:], site, base_dir, date))
+
+    if matched == 0:
+        period = f' between {start or "the first"} and {end or "the last"} date' if start is not None or end is not None else ''
+        raise FileNotFoundError(f"No YEAR_SITE folders for {', '.join(site_names)}{period} in {main_path}")
+    tasks.sort()
+    return tasks
+
+
+
+def _resolve_main_path(main_path=None, catalog=None):
+    """
+    The directory holding the YEAR_SITE folders: main_path if given, else the catalog's main_path (so catalog
+    lookups match the paths that were indexed), else pconfig.MAIN_PATH.
+    """
+
+    if main_path is not None:
+        return main_path
+    if catalog is not None:
+        return catalog.main_path
+    return pconfig.MAIN_PATH
+
+
+
+def _time_of_day_mask(times, time_of_day):
+    """
+    Boolean mask of the times falling in any of the ('HH:MM', 'HH:MM') slices (end exclusive, may wrap midnight).
+    """
+
+    if isinstance(time_of_day[0], str):
+        time_of_day = [time_of_day]
+
+    minutes = times.dt.hour * 60 + times.dt.minute
+    mask = xr.zeros_like(minutes, dtype=bool)
+    for start, end in time_of_day:
+        start = pd.Timedelta(start + ':00').total_seconds() // 60
+        end = pd.Timedelta(end + ':00').total_seconds() // 60
+        if start <= end:
+            mask = mask | ((minutes >= start) & (minutes < end))
+        else:
+            mask = mask | (minutes >= start) | (minutes < end)
+    return mask
+
+
+
+def _minute_mask(base_dir, date, file_patterns, catalog, minutes):
+    """
+    1440-minute mask of a day for the minutes filter of load_range, read from the catalog's availability index
+    (None, i.e. keep every minute, if the day's files are not indexed).
+    """
+
+    if minutes == 'precip':
+        return catalog.minute_mask(os.path.join(base_dir, FILE_PATTERNS['edensity_lwe_rate'].replace('*', date + "*")), 'precip')
+
+    patterns = file_patterns.values() if minutes == 'valid' else [FILE_PATTERNS[_product_for_variable(minutes)]]
+    masks = [catalog.minute_mask(os.path.join(base_dir, pattern.replace('*', date + "*"))) for pattern in patterns]
+    masks = [mask for mask in masks if mask is not None]
+    return np.logical_or.reduce(masks) if masks else None
+
+
+
+def _compact(ds, compact):
+    """
+    Applies the loaders' compact option ('float32', 'sparse' or None) to a dataset.
+    """
+
+    if compact is None or ds is None:
+        return ds
+    if compact not in ['float32', 'sparse']:
+        raise ValueError(f"compact must be 'float32' or 'sparse', not {compact!r}")
+    return compact_distributions(ds, sparse=(compact == 'sparse'))
+
+
+
+def _load_day(base_dir, date, file_patterns, catalog=None, strict=False, variables=None, time_of_day=None, compact=None, minutes=None):
+    """
+    Opens, renames and merges every data type for a single date.
+
+    Parameters:
+    - base_dir: Base directory for the data.
+    - date: Date prefix of the daily files (as returned by get_common_dates).
+    - file_patterns: Dictionary of file patterns for different data types.
+    - catalog: Optional pcatalog.Catalog used for file lookups instead of the filesystem.
+    - strict: If True, return None when any data type is missing for this date.
+    - variables: Optional list of merged variable names to read (lat and lon are always kept).
+    - time_of_day: Optional time-of-day slice(s) to read (see load_range).
+    - compact: Optional compact layout for the 2D distributions (see compact_distributions).
+    - minutes: Optional minute filter answered from the catalog's availability index (see load_range).
+
+    Returns:
+    - An in-memory xarray.Dataset for the day (empty if no files were found).
+    """
+
+    minute_mask = _minute_mask(base_dir, date, file_patterns, catalog, minutes) if minutes is not None else None
+
+    daily_data = []
+    for data_type, pattern in file_patterns.items():
+        files = _glob(os.path.join(base_dir, pattern.replace('*', date + "*")), catalog, data_type)
+
+        if len(files) == 0:
+            if strict:
+                return None
+            continue
+
+        for file in files:
+            with _stage('open', data_type, file):
+                handle = xr.open_dataset(file)
+            with handle:
+                with _stage('rename', data_type):
+                    data = _rename_variables(handle, data_type)
+                if variables is not None:
+                    data = data[[v for v in data.data_vars if v in variables or v in ['lat', 'lon']]]
+                if time_of_day is not None:
+                    data = data.isel(time=_time_of_day_mask(data.time, time_of_day).values)
+                if minute_mask is not None:
+                    data = data.isel(time=minute_mask[(data.time.dt.hour * 60 + data.time.dt.minute).values])
+                with _stage('read', data_type, file):
+                    daily_data.append(data.load())
+
+    if not daily_data:
+        return xr.Dataset()
+    with _stage('merge'):
+        merged = xr.merge(daily_data)
+    return _compact(merged, compact)
+
+
+
+def _load_days(base_dir, dates, file_patterns, n_jobs=None, executor='thread', catalog=None, strict=False, **kwargs):
+    """
+    Loads a list of dates in a worker pool, returning the daily datasets in the same order as dates.
+    base_dir may be a single directory or a list with one directory per date. executor may also be a running
+    Executor shared with other callers (see load_data_for_sites), which is used instead of a new pool.
+    """
+
+    base_dirs = [base_dir] * len(dates) if isinstance(base_dir, str) else base_dir
+    load_day = partial(_load_day, file_patterns=file_patterns, catalog=catalog, strict=strict, **kwargs)
+    if n_jobs == 1 or len(dates) <= 1:
+        return list(map(load_day, base_dirs, dates))
+
+    if isinstance(executor, Executor):
+        return list(executor.map(load_day if isinstance(executor, ProcessPoolExecutor) else _bind_stats(load_day), base_dirs, dates))
+    if executor == 'process':
+        with ProcessPoolExecutor(max_workers=n_jobs) as workers:
+            return list(workers.map(load_day, base_dirs, dates))
+    with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count()) as workers:
+        return list(workers.map(_bind_stats(load_day), base_dirs, dates))
+
+
+
+def _read_year(base_dir, dates, file_patterns, n_jobs=None, executor='thread', catalog=None, compact=None, reader='xarray', strict=False):
+    """
+    Loads and concatenates the given dates of a site-year with the chosen reader ('xarray' or 'netcdf4').
+    Returns None if strict and a data type is missing for one of the dates.
+    """
+
+    if reader not in ['xarray', 'netcdf4']:
+        raise ValueError(f"reader must be 'xarray' or 'netcdf4', not {reader!r}")
+
+    if reader == 'netcdf4':
+        year_data = _read_direct(base_dir, dates, file_patterns, catalog, strict)
+        if year_data is not _UNSUPPORTED:
+            return _compact(year_data, compact)
+
+    daily_data = _load_days(base_dir, dates, file_patterns, n_jobs, executor, catalog, strict=strict, compact=compact)
+    if strict and any(data is None for data in daily_data):
+        return None
+    return _concat_days(daily_data)
+
+
+
+_UNSUPPORTED = object()
+_NETCDF4_LOCK = threading.Lock() # the netCDF-C/HDF5 libraries are not thread-safe
+
+def _read_direct(base_dir, dates, file_patterns, catalog=None, strict=False):
+    """
+    Reads the daily files of a site-year with netCDF4 straight into arrays preallocated for every minute of the
+    given dates, and wraps them in a Dataset named and ordered as the xarray reader's output.
+
+    Returns None if strict and a data type is missing, or _UNSUPPORTED if a file does not fit the daily
+    minute layout (non-float variables, times off the minute grid), in which case the xarray reader is used.
+    """
+
+    import netCDF4 # imported here as only this reader needs it
+
+    files = {}
+    for date in dates:
+        for data_type, pattern in file_patterns.items():
+            found = _glob(os.path.join(base_dir, pattern.replace('*', date + "*")), catalog, data_type)
+            if not found and strict:
+                return None
+            files[date, data_type] = found
+
+    day_starts = np.array([np.datetime64(f'{date[-8:-4]}-{date[-4:-2]}-{date[-2:]}', 'ns') for date in dates])
+    year = _DirectYear(len(dates))
+
+    for data_type in file_patterns:
+        for day, date in enumerate(dates):
+            for file in files[date, data_type]:
+                with _NETCDF4_LOCK:
+                    with _stage('open', data_type, file):
+                        handle = netCDF4.Dataset(file)
+                    with handle, _stage('read', data_type, file):
+                        if not year.read(handle, data_type, day, day_starts[day]):
+                            return _UNSUPPORTED
+
+    if year.attrs is None:
+        return xr.Dataset()
+
+    with _stage('merge'):
+        keep = np.flatnonzero(year.covered)
+        minutes = np.arange(year.n_minutes) * np.timedelta64(60, 's').astype('timedelta64[ns]')
+        times = (day_starts[:, None] + minutes[None, :]).ravel()[keep]
+        subset = keep.size < year.covered.size
+        data_vars = {name: xr.Variable(year.dims[name], values[keep] if subset else values, year.variable_attrs[name])
+                     for name, values in year.arrays.items()}
+        coords = {'time': xr.Variable('time', times, year.time_attrs), **year.coords}
+        return xr.Dataset(data_vars, coords=coords, attrs=year.attrs)
+
+
+
+class _DirectYear:
+    """
+    Preallocated arrays of a site-year filled file by file by _read_direct.
+    """
+
+    n_minutes = 1440
+
+    def __init__(self, n_days):
+        self.covered = np.zeros(n_days * self.n_minutes, dtype=bool)
+        self.arrays, self.dims, self.variable_attrs, self.coords = {}, {}, {}, {}
+        self.attrs, self.time_attrs = None, None
+
+    def read(self, handle, data_type, day, day_start):
+        """
+        Copies the variables of an open netCDF4.Dataset into the minutes of the given day.
+        Returns False if the file does not fit the layout.
+        """
+
+        if self.attrs is None:
+            self.attrs = {key: handle.getncattr(key) for key in handle.ncattrs()}
+
+        time_var = handle.variables['time']
+        if self.time_attrs is None:
+            self.time_attrs = {key: time_var.getncattr(key) for key in time_var.ncattrs() if key not in ['units', 'calendar']}
+        offsets = xr.coding.times.decode_cf_datetime(time_var[:], time_var.units, getattr(time_var, 'calendar', None)) - day_start
+        slots = offsets // np.timedelta64(1, 'm')
+        if np.any(offsets % np.timedelta64(1, 'm') != np.timedelta64(0)) or np.any(slots < 0) or np.any(slots >= self.n_minutes):
+            return False
+        slots = slots + day * self.n_minutes
+        self.covered[slots] = True
+
+        for variable, values in handle.variables.items():
+            if variable == 'time':
+                continue
+            name = _merged_variable_name_for(variable, data_type)
+            values.set_auto_mask(False)
+            attrs = {key: values.getncattr(key) for key in values.ncattrs() if key not in _DECODED_ATTRS}
+
+            if variable in handle.dimensions:
+                if name not in self.coords:
+                    self.coords[name] = xr.Variable(name, _read_values(values), attrs)
+                continue
+
+            if values.dtype.kind != 'f' or values.dimensions[:1] not in [(), ('time',)] or len(values.dimensions) > 2:
+                return False
+            if name not in self.arrays:
+                self.arrays[name] = np.full((self.covered.size,) + values.shape[1:], np.nan, dtype=values.dtype)
+                self.dims[name] = ('time',) + tuple(_merged_dim_name(dim, data_type, handle) for dim in values.dimensions[1:])
+                self.variable_attrs[name] = attrs
+            self.arrays[name][slots] = _read_values(values)
+        return True
+
+_DECODED_ATTRS = ['_FillValue', 'missing_value', 'scale_factor', 'add_offset']
+
+def _merged_variable_name_for(variable, data_type):
+    """
+    Name of a file variable in the merged dataset (see _rename_variables).
+    """
+
+    if variable in ['lat', 'lon', 'time', 'ed_adj', 'nrr_adj', 'rr_adj']:
+        return variable
+    return f"{data_type}_{variable}"
+
+def _merged_dim_name(dim, data_type, handle):
+    """
+    Name of a file dimension in the merged dataset (dimensions with a coordinate variable are renamed with it).
+    """
+
+    return _merged_variable_name_for(dim, data_type) if dim in handle.variables else dim
+
+def _read_values(variable):
+    """
+    Reads a netCDF4 variable (auto masking off) as an array with fill values replaced by NaN.
+    """
+
+    values = variable[:]
+    for key in ['_FillValue', 'missing_value']:
+        if key in variable.ncattrs() and values.dtype.kind == 'f':
+            fill = np.asarray(variable.getncattr(key))
+            if not np.all(np.isnan(fill)):
+                values = np.where(np.isin(values, fill), np.nan, values)
+    return values
+
+
+
+def _concat_days(daily_data):
+    """
+    Concatenates daily datasets along time in a single pass.
+    Compact distributions are concatenated along their rows dimension with their time indices offset.
+    """
+
+    daily_data = [data for data in daily_data if data is not None and len(data.data_vars) > 0]
+    if not daily_data:
+        return xr.Dataset()
+
+    with _stage('concat'):
+        return _concat_compact(daily_data)
+
+def _concat_compact(daily_data):
+    """
+    Body of _concat_days, timed as the 'concat' stage.
+    """
+
+    compact = [name for name in COMPACT_VARIABLES if is_compact(daily_data[0], name)]
+    if not compact:
+        return xr.concat(daily_data, dim='time')
+
+    rows = {name: [] for name in compact}
+    offsets = dict.fromkeys(compact, 0)
+    time_parts = []
+    for data in daily_data:
+        for name in compact:
+            row = data[name + ROW_SUFFIX]
+            data = data.assign({name + ROW_SUFFIX: row.where(row < 0, row + offsets[name]).astype(np.int32)})
+            rows[name].append(data[name])
+            offsets[name] += data[name].shape[0]
+        time_parts.append(data.drop_vars(compact))
+
+    merged = xr.concat(time_parts, dim='time')
+    return merged.assign({name: xr.concat(rows[name], dim=f'{COMPACT_VARIABLES[name]}_rows') for name in compact})
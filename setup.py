@@ -16,6 +16,9 @@ setuptools.setup(
     description="A simple python package to load and interact with Precipitation Imaging Package (PIP) particle microphysics data.",
     url="https://github.com/frasertheking/pipdb",
     packages=setuptools.find_packages(),
+    entry_points={
+        "console_scripts": ["pipdb=pipdb.pcli:main"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
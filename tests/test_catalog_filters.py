@@ -0,0 +1,75 @@
+"""test_catalog_filters.py: the day and minute filters resolve the archive from the catalog alone."""
+
+__author__ = "Fraser King"
+__year__ = "2024"
+__institution__ = "University of Michigan"
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'benchmarks'))
+
+from synthetic import write_synthetic_archive
+from pipdb import pcalc, pcatalog, pconfig, pevents, ppyramid, pread
+
+
+START, END = '2018-01-01', '2018-01-04'
+
+
+@pytest.fixture(scope='module')
+def catalog(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp('archive'))
+    write_synthetic_archive(root, sites=('MQT',), years=(2018,), n_days=4, missing_day_fraction=0,
+                            missing_file_fraction=0, precip_fraction=0.5, seed=1)
+    return pcatalog.open_catalog(root, os.path.join(root, 'pipdb_catalog.sqlite'))
+
+
+
+def test_default_paths_stay_out_of_the_archive(catalog, tmp_path, monkeypatch):
+    monkeypatch.setattr(pconfig, 'CACHE_PATH', str(tmp_path))
+    default = pcatalog.open_catalog(catalog.main_path, refresh=False)
+    assert os.path.dirname(default.db_path) == pconfig.archive_cache_dir(catalog.main_path)
+    assert default.db_path.startswith(str(tmp_path))
+
+
+
+@pytest.mark.parametrize('days, minutes', [(None, None), ('data', None), ('precip', None), (None, 'precip'), ('data', 'psd')])
+def test_load_range(catalog, days, minutes):
+    ds = pread.load_range('MQT', START, END, variables=['psd', 'ed_adj'], catalog=catalog, days=days, minutes=minutes)
+    assert ds.sizes['time'] > 0
+
+
+
+@pytest.mark.parametrize('days, minutes', [(None, None), ('precip', 'precip')])
+def test_iter_days(catalog, days, minutes):
+    loaded = list(pread.iter_days('MQT', START, END, variables=['ed_adj'], catalog=catalog, days=days, minutes=minutes))
+    assert loaded and all(ds.sizes['time'] > 0 for _, _, ds in loaded)
+
+
+
+def test_events(catalog, tmp_path):
+    table = pevents.build_event_table('MQT', output=str(tmp_path / 'events.nc'), catalog=catalog, psd_params=False, days='precip')
+    assert len(table) > 0
+
+    ds = pevents.load_event(table.iloc[0], variables=['ed_adj'], catalog=catalog)
+    assert ds.sizes['time'] > 0
+
+
+
+def test_aggregate_archive(catalog):
+    ds = pcalc.aggregate_archive('MQT', catalog=catalog, n_jobs=1, days='precip', minutes='precip')
+    assert ds['particle_size_distributions_psd_count'].sum() > 0
+
+
+
+def test_build_site_pyramid(catalog):
+    pyramid = ppyramid.build_site_pyramid('MQT', START, END, catalog=catalog, days='data', minutes='valid')
+    assert pyramid and all(level.sizes['time'] > 0 for level in pyramid.values())
+
+
+
+def test_derived_archive(catalog, tmp_path):
+    derived = pcalc.derived_archive('MQT', START, END, catalog=catalog, n_jobs=1, cache_dir=str(tmp_path), days='precip')
+    assert derived['MQT'].sizes['time'] > 0